@@ -1,6 +1,9 @@
 import streamlit as st
 import requests
+import hashlib
+import json
 import os
+import time
 
 # =======================================================
 # ======================= Setup =========================
@@ -10,6 +13,10 @@ import os
 in_container = os.getenv('IN_CONTAINER', False)
 TARGET_API = "coral-reef-fastapi:8000" if in_container else "localhost:8000"
 
+# Filters whose full resolution export may outlast the HTTP timeouts;
+# they default to running as a background job
+SLOW_MODELS = ("GBDehazingRCorrection", "RayleighDistribution")
+
 # =======================================================
 # ================ Function Definitions =================
 # =======================================================
@@ -50,29 +57,83 @@ def get_params(model: str) -> dict:
     return params_res.json()["params"]
 
 
+def get_session(image_key: str, renew: bool = False) -> str:
+    """
+    Returns the backend session ID of an uploaded
+    image. The image is uploaded (once) when there
+    is no session for it yet or the old one expired.
+    """
+    sessions = st.session_state.setdefault("sessions", {})
+    if renew or image_key not in sessions:
+        data = {"file": st.session_state["uploads"][image_key]}
+        session = requests.post(f"http://{TARGET_API}/sessions", files=data)
+        sessions[image_key] = session.json()["id"]
+    return sessions[image_key]
+
+
+def session_post(image_key: str, endpoint: str, **kwargs) -> requests.Response:
+    """
+    Posts to an endpoint of the session of an
+    uploaded image, e.g. "previews". Uploads the
+    image again if the backend dropped the session.
+    """
+    res = requests.post(f"http://{TARGET_API}/sessions/{get_session(image_key)}/{endpoint}",
+                        **kwargs)
+    if res.status_code == 404:
+        res.close()
+        res = requests.post(f"http://{TARGET_API}/sessions/{get_session(image_key, renew=True)}/{endpoint}",
+                            **kwargs)
+    return res
+
+
+def stream_previews(image_key: str):
+    """
+    Calls the stream_session_previews function of
+    the backend for an uploaded image. Yields a
+    dictionary per model as soon as its preview
+    thumbnail (or error) arrives, followed by a
+    dictionary with the total execution time.
+    """
+    with session_post(image_key, "previews/stream", stream=True) as prev:
+        for line in prev.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def follow_job(job_id: str):
+    """
+    Yields the state of an export job whenever it changes,
+    until it is done, failed or cancelled.
+    """
+    with requests.get(f"http://{TARGET_API}/jobs/{job_id}/events", stream=True) as res:
+        for line in res.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
 @st.cache
-def create_previews(data: dict) -> dict:
+def get_result(url: str) -> bytes:
     """
-    Sends an uploaded image to the backend and
-    calls the generate_previews function. Returns
-    a dictionary with the execution time and a
-    list of preview thumbnails.
+    Downloads a processed image linked by the
+    backend. Results never change, so they are
+    cached by URL; errors raise and are not cached.
     """
-    prev = requests.post(f"http://{TARGET_API}/previews", files=data)
-    return prev.json()
+    res = requests.get(f"http://{TARGET_API}{url}")
+    res.raise_for_status()
+    return res.content
 
 
 @st.cache
-def create_preview(model: str, data: dict, paras: dict = None) -> dict:
-    """Sends an uploaded image and a set of user-
-    defined parameters to the backend and calls the
-    generate_preview function. Returns dictionary
-    with a link to the preview image."""
-    prev = requests.post(f"http://{TARGET_API}/preview/{model}",
-                         params=paras,
-                         files=data)
+def create_preview(model: str, image_key: str, paras: dict = None) -> bytes:
+    """Sends a set of user-defined parameters for an
+    uploaded image to the backend and calls the
+    generate_session_preview_image function. Returns
+    the preview image as JPEG bytes. Errors (e.g. a
+    full compute queue) raise and are not cached."""
+    prev = session_post(image_key, f"preview/{model}/image", params=paras)
+    prev.raise_for_status()
 
-    return prev.json()
+    return prev.content
 
 # =======================================================
 # ================== Begin main script ==================
@@ -105,6 +166,7 @@ if st.button("Clear preview"):
     st.write(f'/previews cleared. Deleted {clear_msg["removed"]} '
              f'files in {clear_msg["time"]} seconds.')
     st.legacy_caching.clear_cache()
+    st.session_state.pop("previews", None)
 
 # Upload image widget TODO: add state to be able to reset
 image = st.file_uploader("Upload image")
@@ -117,31 +179,44 @@ if image:
     st.subheader("Original")
     st.image(image)
 
-    # Serialize the image
+    # Serialize the image. It is uploaded to the backend once, later
+    # requests refer to it by session (see get_session)
     img = image.getvalue()
+    image_key = hashlib.sha1(img).hexdigest()
+    st.session_state["uploads"] = {image_key: img}
 
-    # Assemble the request body
-    files = {"file": img}
-
-    # Generate preview images
-    previews = create_previews(files)
-    timing = previews["time"]
-    thumbs = previews["thumbs"]
-
-    # Report render time
     st.subheader("Filter previews")
 
-    # Display preview images in 3xn grid
+    # Generate preview images. They are streamed the first time an
+    # image is shown and replayed from the session state on reruns
+    # (e.g. when a slider moves).
+    stored = st.session_state.get("previews", {})
+    entries = stored.get(image_key) or stream_previews(image_key)
+
+    # Display preview images in 3xn grid as they arrive
     cols = st.columns(3)
     loc = 0
-    for thumb in thumbs:
-        with cols[loc % 3]:
-            st.text(thumb[0])
-            st.image(thumb[1])
-            loc += 1
-
-    # Show compute time
-    st.text(f"Preview images generated in {timing:.2f} seconds.")
+    received = []
+    timing = None
+    for entry in entries:
+        received.append(entry)
+        if "thumb" in entry:
+            with cols[loc % 3]:
+                st.text(f'{entry["model"]} ({entry["time"]:.2f} s)')
+                try:
+                    st.image(get_result(entry["url"]))
+                except requests.HTTPError as error:
+                    st.warning(f'No preview for {entry["model"]}: {error}')
+                loc += 1
+        elif "error" in entry:
+            st.warning(f'No preview for {entry["model"]}: {entry["error"]}')
+        else:
+            timing = entry["time"]
+
+    # Show compute time, only complete streams are kept
+    if timing is not None:
+        st.session_state["previews"] = {image_key: received}
+        st.text(f"Preview images generated in {timing:.2f} seconds.")
 
     # Show preview image - WIP
     col1, col2 = st.columns([2, 1])
@@ -171,27 +246,70 @@ if image:
                         set_params[param] = st.selectbox(param,
                                                          params[param]["options"],
                                                          params[param]["default"])
+
+        # Output format of the filtered image
+        export_format = st.selectbox('Export format', ["jpeg", "png", "tiff", "webp"])
+
+        # Long exports run as a job instead of holding the request
+        as_job = st.checkbox('Run as background job', value=option in SLOW_MODELS)
     with col1:
 
-        img_preview = create_preview(option, files, set_params)
-        st.image(img_preview["prev"], use_column_width='always')
+        try:
+            img_preview = create_preview(option, image_key, set_params)
+            st.image(img_preview, use_column_width='always')
+        except requests.HTTPError as error:
+            st.warning(f'No preview for {option}: {error}')
 
     # Apply filter button
     if st.button("Apply filter") and option:
         # Send to API
-        img_res = requests.post(f"http://{TARGET_API}/files/{option}", files=files)
-
-        # Process response and display new image
-        img_msg = img_res.json()
-        new_img = img_msg["output"]
-        st.image(new_img)
-        st.text(f'Filtered image generated in {img_msg["time"]:.2f} seconds.')
-
-        # Download file button
-        with open(new_img, "rb") as file:
+        start = time.time()
+        export_params = {**set_params, "format": export_format}
+        status = st.empty()
+        if as_job:
+            # Follow the job until the result is ready
+            job = session_post(image_key, f"jobs/{option}", params=export_params).json()
+            for job in follow_job(job["id"]):
+                status.text(f'{job["status"]} {job.get("stage", "")}')
+            if job["status"] == "done":
+                img_res = requests.get(f"http://{TARGET_API}{job['url']}")
+                file_name = os.path.basename(job["output"])
+            else:
+                img_res = None
+                status.text(f'Export {job["status"]}: {job.get("error", "")}')
+        else:
+            img_res = session_post(image_key, f"files/{option}/image", params=export_params)
+            file_name = img_res.headers["Content-Disposition"].split('filename="')[1].rstrip('"')
+
+        if img_res is not None:
+            # Process response and display new image
+            new_img = img_res.content
+            st.image(new_img)
+            status.text(f'Filtered image generated in {time.time() - start:.2f} seconds.')
+
+            # Download file button
             btn = st.download_button(
                 label="Download image",
-                data=file,
-                file_name=f"{new_img.split('/')[-1]}",
-                mime="image/jpg"
+                data=new_img,
+                file_name=file_name,
+                mime=img_res.headers["Content-Type"]
             )
+
+# Batch processing: many images (or zip archives of images) with one
+# filter in a single request, results come back as one zip archive
+st.subheader("Batch")
+batch = st.file_uploader("Upload images or zip archives", accept_multiple_files=True)
+batch_option = st.selectbox('Batch filter', available_models)
+
+if batch and st.button("Process batch"):
+    start = time.time()
+    batch_files = [("files", (upload.name, upload.getvalue())) for upload in batch]
+    batch_res = requests.post(f"http://{TARGET_API}/batch/{batch_option}", files=batch_files)
+    st.text(f'Batch processed in {time.time() - start:.2f} seconds.')
+
+    st.download_button(
+        label="Download results",
+        data=batch_res.content,
+        file_name=f"batch_{batch_option}.zip",
+        mime="application/zip"
+    )
@@ -0,0 +1,108 @@
+"""
+Batch processing of survey folders.
+
+/batch/{model} takes any number of uploaded images, zip archives of
+images, or both, and applies one model with one parameter set to all
+of them. The results are streamed back as a zip archive that is
+written while the images complete (ZipStream), so the first bytes
+leave the server before the last image is processed.
+"""
+
+import io
+import os
+import zipfile
+
+from fastapi import UploadFile
+
+IMAGE_EXTENSIONS = {".bmp", ".jpeg", ".jpg", ".png", ".tif", ".tiff", ".webp"}
+
+
+class BatchItem:
+
+    def __init__(self, name: str, opener):
+        self.name = name
+        self._opener = opener
+
+    def open(self):
+        """Binary file object of the image"""
+        return self._opener()
+
+
+def _is_image(name: str) -> bool:
+    base = os.path.basename(name)
+    # Skip folders, macOS resource forks and other hidden files
+    return (not name.startswith("__MACOSX/") and not base.startswith(".")
+            and os.path.splitext(base)[1].lower() in IMAGE_EXTENSIONS)
+
+
+def batch_items(files: list[UploadFile]) -> list[BatchItem]:
+    """
+    The images of a batch upload. Zip archives are replaced by
+    the images they contain, named by their path in the archive.
+    """
+    items = []
+    for file in files:
+        if zipfile.is_zipfile(file.file):
+            archive = zipfile.ZipFile(file.file)
+            items += [BatchItem(info.filename,
+                                lambda archive=archive, info=info: io.BytesIO(archive.read(info)))
+                      for info in archive.infolist() if not info.is_dir() and _is_image(info.filename)]
+        else:
+            file.file.seek(0)
+            items.append(BatchItem(file.filename, lambda file=file: file.file))
+    return items
+
+
+def output_name(name: str, model: str, extension: str) -> str:
+    """Name of the result of an image in the batch archive"""
+    return f"{os.path.splitext(name)[0]}_{model}{extension}"
+
+
+class _Sink(io.RawIOBase):
+    """Write-only stream collecting what the zip writer produces"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    """
+    Zip archive written entry by entry. add and close return the
+    bytes of the archive produced since the last call, ready to be
+    sent. Entries are stored uncompressed, the images already are.
+    """
+
+    def __init__(self):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w", zipfile.ZIP_STORED)
+        self._names = set()
+
+    def _unique(self, name: str) -> str:
+        stem, extension = os.path.splitext(name)
+        count = 1
+        while name in self._names:
+            count += 1
+            name = f"{stem}_{count}{extension}"
+        self._names.add(name)
+        return name
+
+    def add(self, name: str, data: bytes) -> bytes:
+        """Adds an entry and returns the new bytes of the archive"""
+        self._zip.writestr(self._unique(name), data)
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        self._zip.close()
+        return self._sink.take()
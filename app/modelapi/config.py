@@ -1,7 +1,10 @@
 """Configuration file"""
 
+import os
+
 # Import all existing filters TODO: Make less clunky
 import models.uwiColorRestore.dcp as dcp
+import models.uwiColorRestore.helpers.dcpTiles as dcpTiles
 import models.uwiColorRestore.gbdehazingrcorrection as gbdehaze
 import models.uwiColorRestore.lowComplexityDcp as lcdcp
 import models.uwiEnhance.CLAHE as clahe
@@ -10,45 +13,113 @@ import models.uwiEnhance.HE as he
 import models.uwiEnhance.ICM as icm
 import models.uwiEnhance.RayleighDistribution as rayleigh
 import models.uwiEnhance.RGHS as rghs
+import models.uwiEnhance.helpers.rghsTiles as rghsTiles
 import models.uwiEnhance.UCM as ucm
 
 # Application paths
 paths = {'export': '../storage/export/',
-         'preview': '../storage/preview/'}
+         'preview': '../storage/preview/',
+         'jobs': '../storage/jobs/'}
+
+# Compute executor (see executor.py). Jobs beyond workers + queue
+# are rejected with 503 and the Retry-After header below. Exports and
+# batches leave 'reserved' workers to previews; a job waiting longer
+# than 'max_wait' seconds runs next regardless of its priority.
+executor = {'workers': int(os.getenv('COMPUTE_WORKERS', os.cpu_count() or 1)),
+            'queue': int(os.getenv('COMPUTE_QUEUE', 16)),
+            'retry_after': 5,
+            'reserved': int(os.getenv('COMPUTE_RESERVED', 1)),
+            'max_wait': float(os.getenv('COMPUTE_MAX_WAIT', 10))}
+
+# Seconds a single model may take in /previews before it is skipped
+timeouts = {'preview': float(os.getenv('PREVIEW_TIMEOUT', 30))}
+
+# Images of a /batch request processed at the same time; the
+# default leaves the compute queue to interactive requests
+batch = {'concurrency': int(os.getenv('BATCH_CONCURRENCY', executor['workers']))}
+
+# Asynchronous jobs (see jobs.py): the queue database, jobs running
+# at the same time and seconds finished jobs are kept
+jobs = {'path': os.path.join(paths['jobs'], 'jobs.sqlite3'),
+        'workers': int(os.getenv('JOB_WORKERS', 1)),
+        'ttl': float(os.getenv('JOB_TTL', 7 * 24 * 3600))}
+
+# Image sessions (see sessions.py): number of decoded images kept in
+# memory and seconds a session lives without being used
+sessions = {'size': int(os.getenv('SESSION_SIZE', 8)),
+            'ttl': float(os.getenv('SESSION_TTL', 1800))}
+
+# Default output encodings (see encoders.py) of the preview and
+# export endpoints, requests may override them
+encodings = {'preview': {'format': 'webp', 'quality': 80},
+             'export': {'format': 'jpeg', 'quality': 95}}
+
+# Result cache (see results.py): size limits of the in-memory
+# and on-disk (preview and export folders) tiers in bytes, and
+# whether results served as bytes are also written to storage
+results = {'memory_bytes': int(os.getenv('RESULTS_MEMORY_BYTES', 256 * 2 ** 20)),
+           'disk_bytes': int(os.getenv('RESULTS_DISK_BYTES', 4 * 2 ** 30)),
+           'persist': os.getenv('RESULTS_PERSIST', '1') == '1'}
+
+# Proxy resolution execution (see proxy.py): radius and epsilon of
+# the guided filter fitting the color transform at proxy resolution,
+# and smallest accepted proxy
+proxy = {'radius': 2,
+         'epsilon': 1e-5,
+         'min_size': 256}
+
+# Tiled execution (see tiling.py): models with a "tiled" recipe run
+# tile by tile on images with more pixels than this, tiles have size
+# x size pixels plus the context the model needs
+tiling = {'size': int(os.getenv('TILE_SIZE', 2048)),
+          'pixels': int(os.getenv('TILE_PIXELS', 64 * 2 ** 20))}
+
+# Long side of the proxy image, 0 runs the model on the full image
+PROXY_PARAM = {"type": "selectbox", "options": (0, 1024, 2048), "default": 0}
 
 # Command pattern. The backend uses this dictionary
 # to tell the frontend what filters are available.
+# Models run in a process pool unless "executor" is "thread".
 models = {"DCP":
               {"func": dcp.dcp,
+               "executor": "thread",
+               "tiled": dcpTiles,
                "params": {
                    "omega": {"type": "slider", "min": 0.01, "max": 1.00,
                              "default": 0.01, "step": 0.01},
                    "t0": {"type": "slider", "min": 0.1, "max": 1.0,
                           "default": 0.1, "step": 0.1},
-                   "blockSize": {"type": "slider", "min": 3, "max": 25,
+                   "blockSize": {"type": "slider", "min": 3, "max": 51,
                                  "default": 15, "step": 2},
                    "percent": {"type": "slider", "min": 0.001, "max": 0.1,
                                "default": 0.001, "step": 0.001},
                    "meanMode": {"type": "selectbox", "options": ("True", "False"),
-                                "default": 1}
+                                "default": 1},
+                   "subsample": {"type": "slider", "min": 1, "max": 8,
+                                 "default": 1, "step": 1}
                }
                },
           "CLAHE":
-              {"func": clahe.clahe, "params": {}},
+              {"func": clahe.clahe, "executor": "thread", "params": {}},
           "GBDehazingRCorrection":
-              {"func": gbdehaze.gbdehazingrcoorection, "params": {}},
+              {"func": gbdehaze.gbdehazingrcoorection,
+               "params": {
+                   "subsample": {"type": "slider", "min": 1, "max": 8,
+                                 "default": 1, "step": 1}
+               }
+               },
           "LowComplexityDCP":
               {"func": lcdcp.low_complexity_dcp, "params": {}},
           "GC":
-              {"func": gc.gc, "params": {}},
+              {"func": gc.gc, "executor": "thread", "params": {}},
           "HE":
-              {"func": he.he, "params": {}},
+              {"func": he.he, "executor": "thread", "params": {}},
           "ICM":
               {"func": icm.icm, "params": {}},
           "RayleighDistribution":
-              {"func": rayleigh.rayleigh_distribution, "params": {}},
+              {"func": rayleigh.rayleigh_distribution, "params": {"proxy": PROXY_PARAM}},
           "RGHS":
-              {"func": rghs.rghs, "params": {}},
+              {"func": rghs.rghs, "tiled": rghsTiles, "params": {"proxy": PROXY_PARAM}},
           "UCM":
-              {"func": ucm.ucm, "params": {}}
+              {"func": ucm.ucm, "params": {"proxy": PROXY_PARAM}}
           }
@@ -0,0 +1 @@
+# Lets pytest import the backend modules (config, encoders, ...) from tests/
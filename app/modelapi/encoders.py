@@ -0,0 +1,93 @@
+"""
+Output encoders.
+
+Results are encoded once per (format, quality) and cached like that
+(see results.py). Every endpoint kind has a default encoding in
+config.encodings; requests may pick another one with the "format" and
+"quality" query parameters. quality means:
+
+    jpeg, webp   quality 0..100 (webp 101 is lossless)
+    png          zlib compression level 0..9 (lossless)
+    tiff         0 uncompressed, anything else LZW (lossless)
+
+Encoding runs in worker threads, never on the event loop.
+"""
+
+import cv2
+import numpy as np
+from fastapi import HTTPException
+
+import config as cfg
+
+# format: (extension, media type, quality range, default quality, OpenCV flag)
+FORMATS = {"jpeg": (".jpg", "image/jpeg", (0, 100), 95, cv2.IMWRITE_JPEG_QUALITY),
+           "webp": (".webp", "image/webp", (1, 101), 90, cv2.IMWRITE_WEBP_QUALITY),
+           "png": (".png", "image/png", (0, 9), 3, cv2.IMWRITE_PNG_COMPRESSION),
+           "tiff": (".tif", "image/tiff", (0, 1), 1, cv2.IMWRITE_TIFF_COMPRESSION)}
+
+MEDIA_TYPES = {extension: media_type for extension, media_type, *_ in FORMATS.values()}
+
+# OpenCV TIFF compression schemes
+_TIFF_NONE = 1
+_TIFF_LZW = 5
+
+
+class Encoding:
+
+    def __init__(self, format: str, quality: int = None):
+        if format not in FORMATS:
+            raise HTTPException(status_code=422,
+                                detail=f"Unknown format {format}, use one of {sorted(FORMATS)}")
+        if quality is None:
+            quality = FORMATS[format][3]
+        low, high = FORMATS[format][2]
+        if not low <= quality <= high:
+            raise HTTPException(status_code=422,
+                                detail=f"quality of {format} must be between {low} and {high}")
+        self.format = format
+        self.quality = quality
+
+    @property
+    def key(self) -> str:
+        return f"{self.format}:{self.quality}"
+
+    @property
+    def extension(self) -> str:
+        return FORMATS[self.format][0]
+
+    @property
+    def media_type(self) -> str:
+        return FORMATS[self.format][1]
+
+    def encode(self, img: np.ndarray) -> bytes:
+        if img.dtype != np.uint8:
+            # Some models return float images, which only some OpenCV encoders take
+            img = np.uint8(np.clip(np.rint(img), 0, 255))
+        flag = FORMATS[self.format][4]
+        value = self.quality
+        if self.format == "tiff":
+            value = _TIFF_LZW if self.quality else _TIFF_NONE
+
+        ok, encoded = cv2.imencode(self.extension, img, [flag, value])
+        if not ok:
+            raise ValueError(f"Could not encode image as {self.format}")
+        return encoded.tobytes()
+
+
+def encoding_for(kind: str, params: dict) -> Encoding:
+    """
+    Removes the "format" and "quality" query parameters from
+    params and returns the requested encoding, falling back to
+    the default of the endpoint kind ("preview" or "export").
+    """
+    default = cfg.encodings[kind]
+    format = params.pop("format", default["format"])
+    quality = params.pop("quality", None)
+    if quality is None and format == default["format"]:
+        quality = default["quality"]
+    if quality is not None:
+        try:
+            quality = int(quality)
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f"quality must be an integer, got {quality}")
+    return Encoding(format, quality)
@@ -0,0 +1,262 @@
+"""
+Compute executor for the model functions.
+
+Filters are CPU bound and must not run on the event loop, otherwise one
+export blocks the health check and every other request. Models run in
+a process pool by default; models marked with "executor": "thread" in
+config.models (OpenCV and numpy heavy code that releases the GIL, or
+models relying on in-process caches) run in a thread pool instead.
+
+At most workers + queue jobs are accepted at a time. Further requests
+are rejected with 503 and a Retry-After header instead of piling up.
+Every running job holds one thread of the thread budget of the
+parallel model sections (see models/parallel.py).
+
+Jobs are handed to the pools only when one of the workers is free, in
+priority order rather than arrival order (see PRIORITIES): a slider
+preview waiting behind full resolution exports starts as soon as a
+worker finishes. Exports and batches never take the last 'reserved'
+workers, so previews find a free worker while bulk work runs, and a job
+that waited 'max_wait' seconds goes first whatever its class, so bulk
+work is not starved by a steady stream of previews. info() reports the
+queue wait of every class.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+import config as cfg
+from models.parallel import runCounted, sharedBudget, useBudget
+from proxy import run_proxy
+from tiling import run_tiled, tiled
+
+
+# Worker and job processes are forked from a clean server process, not
+# from this one: its threads (event loop, thread pools, the DCP caches)
+# may hold locks at the moment of the fork and hang the child
+if "forkserver" in multiprocessing.get_all_start_methods():
+    processes = multiprocessing.get_context("forkserver")
+    # Imports all models once in the fork server instead of in every child
+    processes.set_forkserver_preload(["config"])
+else:
+    processes = multiprocessing.get_context("spawn")
+
+# Priority classes, most urgent first: interactive previews, the
+# preview grid of all models, exports and batches
+PRIORITIES = ("preview", "grid", "export", "batch")
+
+# Classes kept off the reserved workers
+BULK = ("export", "batch")
+
+
+class _Waiter:
+
+    def __init__(self, priority: str):
+        self.priority = priority
+        self.since = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class ComputeExecutor:
+
+    def __init__(self, workers: int, queue: int, retry_after: int, reserved: int, max_wait: float):
+        self.workers = workers
+        self.capacity = workers + queue
+        self.retry_after = retry_after
+        # A single worker can not be reserved
+        self.reserved = max(min(reserved, workers - 1), 0)
+        self.max_wait = max_wait
+        self.pending = 0
+        self.running = {priority: 0 for priority in PRIORITIES}
+        self._waiting = {priority: deque() for priority in PRIORITIES}
+        # Per class: jobs started, seconds they waited in total and at most
+        self.waits = {priority: {"count": 0, "seconds": 0.0, "max_seconds": 0.0} for priority in PRIORITIES}
+        self._pools = {}
+        self._budget = None
+
+    @property
+    def budget(self):
+        """Thread budget semaphore shared with worker processes"""
+        if self._budget is None:
+            self._budget = sharedBudget(processes)
+        return self._budget
+
+    def _pool(self, kind: str):
+        """Creates pools on first use, so importing main does not fork"""
+        if kind not in self._pools:
+            match kind:
+                case "process":
+                    # Workers share the thread budget of parallel sections
+                    self._pools[kind] = ProcessPoolExecutor(self.workers, mp_context=processes,
+                                                            initializer=useBudget, initargs=(self.budget,))
+                case "thread":
+                    self._pools[kind] = ThreadPoolExecutor(self.workers)
+                case _:
+                    raise ValueError(f"Unknown executor: {kind}")
+        return self._pools[kind]
+
+    def reserve(self):
+        """
+        Takes a slot for a job or raises 503 when all slots are
+        taken. Must be called from the event loop.
+        """
+        if self.pending >= self.capacity:
+            raise HTTPException(status_code=503,
+                                detail="Compute queue is full",
+                                headers={"Retry-After": str(self.retry_after)})
+        self.pending += 1
+
+    def release(self):
+        self.pending -= 1
+
+    def _next(self) -> _Waiter | None:
+        """The waiting job to start next, if a worker is free for it"""
+        busy = sum(self.running.values())
+        if busy >= self.workers:
+            return None
+        bulk = sum(self.running[priority] for priority in BULK) < self.workers - self.reserved
+
+        candidates = [queue[0] for priority, queue in self._waiting.items()
+                      if queue and (bulk or priority not in BULK)]
+        if not candidates:
+            return None
+        # Starvation protection, the longest waiting job beyond max_wait goes first
+        starved = [waiter for waiter in candidates if time.monotonic() - waiter.since >= self.max_wait]
+        if starved:
+            return min(starved, key=lambda waiter: waiter.since)
+        return candidates[0]
+
+    def _dispatch(self):
+        while (waiter := self._next()) is not None:
+            self._waiting[waiter.priority].popleft()
+            self.running[waiter.priority] += 1
+            waited = time.monotonic() - waiter.since
+            stats = self.waits[waiter.priority]
+            stats["count"] += 1
+            stats["seconds"] += waited
+            stats["max_seconds"] = max(stats["max_seconds"], waited)
+            waiter.future.set_result(None)
+
+    async def acquire_worker(self, priority: str):
+        """
+        Waits until a worker is free for a job of the given
+        priority class and takes it. Must be called from the
+        event loop.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        waiter = _Waiter(priority)
+        self._waiting[priority].append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Got the worker just before being cancelled
+                self.release_worker(priority)
+            else:
+                self._waiting[priority].remove(waiter)
+            raise
+
+    def release_worker(self, priority: str):
+        self.running[priority] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def worker(self, priority: str):
+        """Holds a worker for work running outside the pools (see jobs.py)"""
+        await self.acquire_worker(priority)
+        try:
+            yield
+        finally:
+            self.release_worker(priority)
+
+    async def run(self, kind: str, func, *args, priority: str = "export", **kwargs):
+        """
+        Runs func(*args, **kwargs) in the given pool, once a worker
+        is free for the priority class, and awaits the result.
+        Cancelling the caller (e.g. on a timeout) drops a job that
+        has not started yet; a running job keeps its worker until
+        it finishes, since pool workers cannot be interrupted.
+        """
+        self.reserve()
+        try:
+            await self.acquire_worker(priority)
+        except BaseException:
+            self.release()
+            raise
+        try:
+            future = self._pool(kind).submit(runCounted, func, *args, **kwargs)
+        except BaseException:
+            self.release()
+            self.release_worker(priority)
+            raise
+
+        loop = asyncio.get_running_loop()
+
+        def finished():
+            self.release()
+            self.release_worker(priority)
+
+        def released(_):
+            try:
+                loop.call_soon_threadsafe(finished)
+            except RuntimeError:
+                # Event loop already closed, the server is shutting down
+                pass
+
+        future.add_done_callback(released)
+        return await asyncio.wrap_future(future)
+
+    def info(self) -> dict:
+        """Workers in use and queue wait times per priority class"""
+        now = time.monotonic()
+        classes = {}
+        for priority in PRIORITIES:
+            stats = self.waits[priority]
+            waiting = self._waiting[priority]
+            classes[priority] = {"running": self.running[priority],
+                                 "waiting": len(waiting),
+                                 "longest_waiting_seconds": now - waiting[0].since if waiting else 0.0,
+                                 "started": stats["count"],
+                                 "mean_wait_seconds": stats["seconds"] / stats["count"] if stats["count"] else 0.0,
+                                 "max_wait_seconds": stats["max_seconds"]}
+        return {"workers": self.workers,
+                "reserved": self.reserved,
+                "pending": self.pending,
+                "classes": classes}
+
+    def shutdown(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pools.clear()
+
+
+executor = ComputeExecutor(**cfg.executor)
+
+
+def call_model(model: str, img, **params):
+    """
+    Applies a model from config.models to img in the calling
+    thread, on a proxy of img when params has a "proxy" size and
+    tile by tile when img is large (see tiling.py).
+    """
+    entry = cfg.models[model]
+    proxy = params.pop("proxy", 0)
+    if proxy:
+        return run_proxy(entry["func"], img, proxy, **params)
+    if tiled(model, img.shape):
+        return run_tiled(model, img, **params)
+    return entry["func"](img, **params)
+
+
+async def run_model(model: str, img, priority: str = "export", **params):
+    """Runs call_model in the executor of the model with a priority class"""
+    kind = cfg.models[model].get("executor", "process")
+    return await executor.run(kind, call_model, model, img, priority=priority, **params)
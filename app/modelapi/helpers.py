@@ -7,7 +7,7 @@ def param_types(params: dict) -> dict:
         match param:
             case "omega" | "t0" | "percent":
                 params[param] = float(params[param])
-            case "blockSize":
+            case "blockSize" | "subsample" | "proxy":
                 params[param] = int(params[param])
             case "meanMode":
                 params[param] = bool(params[param])
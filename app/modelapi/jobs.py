@@ -0,0 +1,333 @@
+"""
+Asynchronous jobs for long exports.
+
+A full resolution export of the slow filters can outlast HTTP and proxy
+timeouts when the connection is held until the filter finishes. A job
+is submitted instead and answered at once with its ID; the client polls
+/jobs/{id}, or follows /jobs/{id}/events, until the job is done and
+links its result.
+
+Jobs are kept in a SQLite database and their input images as .npy files
+next to it, so queued jobs survive a restart. Jobs that were running
+when the server stopped are queued again on the next start. Up to
+jobs['workers'] jobs run at a time, each in its own process (sharing
+the thread budget of models/parallel.py), so cancelling a running job
+terminates that process and its CPU time ends with it. Results go to
+the export folder of the result cache; a job whose result is already
+cached is done as soon as it is submitted.
+
+Job statuses: queued, running (with the stage: waiting for a compute
+worker, starting, loading, running, encoding), done, failed and
+cancelled.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+from fastapi import HTTPException
+
+import config as cfg
+from encoders import Encoding
+from executor import call_model, executor, processes
+from models.parallel import runCounted, useBudget
+from results import results
+
+TERMINAL = ("done", "failed", "cancelled")
+
+# Seconds between status checks of /jobs/{id}/events
+_POLL = 0.25
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    params TEXT NOT NULL,
+    format TEXT NOT NULL,
+    quality INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    output TEXT,
+    error TEXT,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, submitted);
+"""
+
+
+def _run_job(model: str, path: str, params: dict, encoding: Encoding, budget, connection):
+    """Runs a job in its own process, reporting to the parent through connection"""
+    useBudget(budget)
+    try:
+        connection.send(("stage", "loading"))
+        img = np.load(path)
+        connection.send(("stage", "running"))
+        output = runCounted(call_model, model, img, **params)
+        connection.send(("stage", "encoding"))
+        start = time.time()
+        data = encoding.encode(output)
+        connection.send(("done", data, time.time() - start))
+    except Exception as error:
+        connection.send(("failed", repr(error)))
+
+
+class JobQueue:
+
+    def __init__(self, path: str, workers: int, ttl: float):
+        self.path = path
+        self.folder = os.path.dirname(path)
+        self.workers = workers
+        self.ttl = ttl
+        self._db = None
+        self._lock = threading.Lock()
+        self._wakeup = None
+        self._tasks = []
+        # Job ID: process of a running job
+        self._processes = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        """Opens the database on first use, so importing main creates no files"""
+        if self._db is None:
+            os.makedirs(self.folder, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.row_factory = sqlite3.Row
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def _query(self, query: str, args: tuple = ()) -> list:
+        with self._lock:
+            return self._connection().execute(query, args).fetchall()
+
+    def _input(self, job_id: str) -> str:
+        return os.path.join(self.folder, f"{job_id}.npy")
+
+    def _drop_input(self, job_id: str):
+        try:
+            os.remove(self._input(job_id))
+        except FileNotFoundError:
+            pass
+
+    def start(self):
+        """
+        Requeues the jobs of a previous run that did not finish,
+        forgets finished jobs older than ttl and starts the workers.
+        Must be called from the event loop.
+        """
+        self._query("UPDATE jobs SET status = 'queued', stage = NULL, started = NULL "
+                    "WHERE status = 'running'")
+        expiry = time.time() - self.ttl
+        expired = self._query("SELECT id FROM jobs WHERE finished < ?", (expiry,))
+        self._query("DELETE FROM jobs WHERE finished < ?", (expiry,))
+        for row in expired:
+            self._drop_input(row["id"])
+
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stops the workers, running jobs are queued again on the next start"""
+        for task in self._tasks:
+            task.cancel()
+        for process in list(self._processes.values()):
+            process.terminate()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _add(self, job_id: str, model: str, img: np.ndarray, params: dict, encoding: Encoding, key: str):
+        now = time.time()
+        output = results.get(key)
+        if output is None:
+            np.save(self._input(job_id), img)
+        self._query("INSERT INTO jobs (id, model, params, format, quality, key, status, output, "
+                    "submitted, started, finished) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, model, json.dumps(params), encoding.format, encoding.quality, key,
+                     "queued" if output is None else "done", output,
+                     now, None if output is None else now, None if output is None else now))
+
+    async def submit(self, model: str, img: np.ndarray, params: dict, encoding: Encoding, key: str) -> dict:
+        """
+        Queues a job applying a model to img and returns it. key
+        is the result key of the job (see results.py).
+        """
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._add, job_id, model, img, params, encoding, key)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return await self.get(job_id)
+
+    # The queries of the public methods run off the event loop
+
+    async def get(self, job_id: str) -> dict:
+        """Returns a job, raises 404 when unknown"""
+        return await asyncio.to_thread(self._get, job_id)
+
+    def _get(self, job_id: str) -> dict:
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+        return self._describe(rows[0], self._positions() if rows[0]["status"] == "queued" else {})
+
+    async def list(self, status: str = None, limit: int = 100) -> list:
+        """Most recently submitted jobs, optionally with one status"""
+        return await asyncio.to_thread(self._list, status, limit)
+
+    def _list(self, status: str, limit: int) -> list:
+        if status is None:
+            rows = self._query("SELECT * FROM jobs ORDER BY submitted DESC LIMIT ?", (limit,))
+        else:
+            rows = self._query("SELECT * FROM jobs WHERE status = ? ORDER BY submitted DESC LIMIT ?",
+                               (status, limit))
+        positions = self._positions() if any(row["status"] == "queued" for row in rows) else {}
+        return [self._describe(row, positions) for row in rows]
+
+    def _positions(self) -> dict:
+        """Job ID: position in the queue, of all queued jobs"""
+        rows = self._query("SELECT id, ROW_NUMBER() OVER (ORDER BY submitted) FROM jobs "
+                           "WHERE status = 'queued'")
+        return dict(rows)
+
+    def _describe(self, row: sqlite3.Row, positions: dict) -> dict:
+        job = {"id": row["id"],
+               "model": row["model"],
+               "params": json.loads(row["params"]),
+               "format": row["format"],
+               "status": row["status"],
+               "submitted": row["submitted"]}
+        if row["status"] == "queued":
+            job["position"] = positions[row["id"]]
+        if row["status"] == "running":
+            job["stage"] = row["stage"]
+        if row["started"] is not None:
+            job["queue_time"] = row["started"] - row["submitted"]
+        if row["finished"] is not None:
+            job["time"] = row["finished"] - (row["started"] or row["submitted"])
+        if row["status"] == "done":
+            job["output"] = row["output"]
+            job["url"] = f"/results/{row['key']}"
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+    async def events(self, job_id: str):
+        """Yields the job whenever its status or stage changes, until it ends"""
+        last = None
+        while True:
+            job = await self.get(job_id)
+            state = (job["status"], job.get("stage"), job.get("position"))
+            if state != last:
+                yield job
+                last = state
+            if job["status"] in TERMINAL:
+                return
+            await asyncio.sleep(_POLL)
+
+    async def cancel(self, job_id: str) -> dict:
+        """
+        Cancels a queued or running job; a running job's process
+        is terminated. Finished jobs are left as they are.
+        """
+        return await asyncio.to_thread(self._cancel, job_id)
+
+    def _cancel(self, job_id: str) -> dict:
+        self._get(job_id)
+        self._query("UPDATE jobs SET status = 'cancelled', stage = NULL, finished = ? "
+                    "WHERE id = ? AND status IN ('queued', 'running')", (time.time(), job_id))
+        process = self._processes.get(job_id)
+        if process is not None:
+            process.terminate()
+        else:
+            self._drop_input(job_id)
+        return self._get(job_id)
+
+    def _claim(self) -> sqlite3.Row | None:
+        """Marks the oldest queued job as running and returns it"""
+        with self._lock:
+            db = self._connection()
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY submitted LIMIT 1").fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = 'running', stage = 'waiting', started = ? WHERE id = ?",
+                           (time.time(), row["id"]))
+            return row
+
+    def _finish(self, job_id: str, status: str, output: str = None, error: str = None):
+        # A job cancelled meanwhile stays cancelled
+        self._query("UPDATE jobs SET status = ?, stage = NULL, output = ?, error = ?, finished = ? "
+                    "WHERE id = ? AND status = 'running'", (status, output, error, time.time(), job_id))
+
+    async def _work(self):
+        while True:
+            job = await asyncio.to_thread(self._claim)
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            try:
+                await self._run(job)
+            except Exception as error:
+                await asyncio.to_thread(self._finish, job["id"], "failed", error=repr(error))
+
+    async def _run(self, job: sqlite3.Row):
+        # Jobs take turns with export requests for the compute workers
+        async with executor.worker("export"):
+            if (await self.get(job["id"]))["status"] != "running":
+                # Cancelled while waiting for a worker
+                return
+            await asyncio.to_thread(self._query, "UPDATE jobs SET stage = 'starting' WHERE id = ?", (job["id"],))
+            await self._process(job)
+
+    async def _process(self, job: sqlite3.Row):
+        job_id = job["id"]
+        encoding = Encoding(job["format"], job["quality"])
+
+        # Started like the process pool workers of the executor, sharing their budget
+        receiver, sender = processes.Pipe(duplex=False)
+        args = (job["model"], self._input(job_id), json.loads(job["params"]), encoding, executor.budget, sender)
+        process = processes.Process(target=_run_job, args=args, daemon=True)
+        process.start()
+        sender.close()
+        self._processes[job_id] = process
+
+        requeued = False
+        try:
+            while True:
+                try:
+                    # Ends with EOFError when the process exits or is terminated
+                    message = await asyncio.to_thread(receiver.recv)
+                except EOFError:
+                    break
+                match message:
+                    case ("stage", stage):
+                        await asyncio.to_thread(self._query, "UPDATE jobs SET stage = ? "
+                                                "WHERE id = ? AND status = 'running'", (stage, job_id))
+                    case ("done", data, seconds):
+                        output = await asyncio.to_thread(results.put_encoded, job["key"], job["model"],
+                                                         data, "export", encoding, seconds)
+                        await asyncio.to_thread(self._finish, job_id, "done", output=output)
+                    case ("failed", error):
+                        await asyncio.to_thread(self._finish, job_id, "failed", error=error)
+
+            await asyncio.to_thread(process.join)
+            # No-op unless the process died without reporting (e.g. out of memory)
+            await asyncio.to_thread(self._finish, job_id, "failed",
+                                    error=f"Job process exited with code {process.exitcode}")
+        except asyncio.CancelledError:
+            # Server shutdown, the job runs again on the next start and keeps its input
+            process.terminate()
+            requeued = True
+            raise
+        finally:
+            del self._processes[job_id]
+            if not requeued:
+                receiver.close()
+                self._drop_input(job_id)
+
+
+jobs = JobQueue(**cfg.jobs)
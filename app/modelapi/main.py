@@ -1,15 +1,26 @@
+import asyncio
+import json
 import os
 import time
-import uuid
+from typing import List
 
 import cv2
 import numpy as np
 from enum import Enum
 from PIL import Image
-from fastapi import FastAPI, File, UploadFile, Request
+from fastapi import BackgroundTasks, FastAPI, File, HTTPException, UploadFile, Request
+from fastapi.responses import Response, StreamingResponse
 from helpers import param_types
 
 import config as cfg
+from batch import BatchItem, ZipStream, batch_items, output_name
+from encoders import MEDIA_TYPES, Encoding, encoding_for
+from executor import executor, run_model
+from jobs import jobs
+from proxy import compare, proxy_params
+from results import image_digest, result_key, results
+from sessions import ImageSession, sessions
+from singleflight import inflight
 
 
 # FastAPI instance
@@ -22,6 +33,19 @@ def read_root():
     return {"message": "OK"}
 
 
+@app.on_event("startup")
+async def start_jobs():
+    """Starts the job workers, see jobs.py"""
+    jobs.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+    """Stops the job workers and the compute pools"""
+    await jobs.stop()
+    executor.shutdown()
+
+
 @app.get("/models")
 async def get_models():
     """Return the collection of available models"""
@@ -34,9 +58,296 @@ async def get_params(model: str = None) -> dict:
     return {"params": cfg.models[model]["params"]}
 
 
+def decode_stream(stream) -> np.ndarray:
+    """Decodes an image file object into an OpenCV (BGR) array"""
+    image = np.array(Image.open(stream).convert("RGB"))
+
+    # Read image with OpenCV as RGB (instead of BGR)
+    return cv2.cvtColor(image, cv2.cv2.COLOR_RGB2BGR)
+
+
+def decode_image(file: UploadFile) -> np.ndarray:
+    """Decodes an uploaded image into an OpenCV (BGR) array"""
+    return decode_stream(file.file)
+
+
+def preview_thumbnail(img: np.ndarray) -> np.ndarray:
+    """Returns the 256x256 thumbnail used for previews"""
+    return cv2.resize(img, (256, 256), interpolation=cv2.INTER_AREA)
+
+
+def decode_preview(file: UploadFile) -> np.ndarray:
+    """
+    Decodes an uploaded image straight into the preview
+    thumbnail. JPEGs are decoded at the largest power of two
+    reduction (DCT scaling) that still covers 256x256, so
+    the full resolution image is never built.
+    """
+    image = Image.open(file.file)
+    image.draft("RGB", (256, 256))
+    image = np.array(image)
+
+    return preview_thumbnail(cv2.cvtColor(image, cv2.cv2.COLOR_RGB2BGR))
+
+
+async def apply_model(model: str,
+                      img: np.ndarray,
+                      params: dict,
+                      folder: str,
+                      digest: str = None,
+                      timeout: float = None,
+                      write: bool = True,
+                      encoding: Encoding = None,
+                      priority: str = None,
+                      keep: bool = True) -> tuple:
+    """
+    Applies a model to img unless the result is cached. Returns
+    the result key, the file location, whether the result came
+    from the cache and, without write, the encoded bytes (None
+    with write). New results are stored in the given folder
+    ("preview" or "export"); without write the file is left to
+    results.persist. digest is the image_digest of img,
+    computed when not given. encoding defaults to the one of
+    the folder in config.encodings, the executor priority class
+    to the folder name. Without keep, the result does not take
+    space in the memory tier (bulk work that is not read again).
+    """
+    if digest is None:
+        digest = await asyncio.to_thread(image_digest, img)
+    encoding = encoding or encoding_for(folder, {})
+    params = proxy_params(model, params, img.shape)
+    key = result_key(digest, model, params, img.shape, encoding)
+
+    # One lookup per request, off the event loop (it may read or write files)
+    if write:
+        name = await asyncio.to_thread(results.get, key)
+        if name is not None:
+            return key, name, True, None
+    else:
+        data = await asyncio.to_thread(results.get_data, key, keep)
+        if data is not None:
+            return key, results.location(key), True, data
+
+    async def compute() -> tuple:
+        # Some models modify their input, every model gets its own copy
+        output = await run_model(model, img.copy(), priority or folder, **params)
+        return await asyncio.to_thread(results.put, key, model, output, folder, encoding, write, keep)
+
+    # Identical requests in flight share one computation
+    (name, data), joined = await asyncio.wait_for(inflight.run(key, compute), timeout=timeout)
+    if joined and write:
+        # The computation may have left writing the file to its own request,
+        # a file it did write is not written again (readers do not take the lock)
+        name = await asyncio.to_thread(results.get, key, False)
+        if name is None:
+            name = await asyncio.to_thread(results.store, key, model, data, folder, encoding, True, keep)
+    return key, name, False, None if write else data
+
+
+async def image_response(model: str,
+                         img: np.ndarray,
+                         params: dict,
+                         encoding: Encoding,
+                         folder: str,
+                         digest: str,
+                         request: Request,
+                         background: BackgroundTasks) -> Response:
+    """
+    Applies a model and returns the encoded bytes of the result.
+    The result key is the ETag; a request that already holds
+    the result gets 304 without the model running.
+    """
+    params = proxy_params(model, params, img.shape)
+    key = result_key(digest, model, params, img.shape, encoding)
+    if request.headers.get("if-none-match") == f'"{key}"':
+        return Response(status_code=304, headers={"ETag": f'"{key}"'})
+
+    key, name, _, data = await apply_model(model, img, params, folder, digest,
+                                           write=False, encoding=encoding)
+
+    # Optional copy in storage, written after the response is sent
+    background.add_task(results.persist, key)
+    return result_bytes(key, name, data)
+
+
+def result_bytes(key: str, name: str, data: bytes) -> Response:
+    """Response with the encoded bytes of a cached result"""
+    return Response(data,
+                    media_type=MEDIA_TYPES[os.path.splitext(name)[1]],
+                    headers={"ETag": f'"{key}"',
+                             "Cache-Control": "public, max-age=31536000, immutable",
+                             "Content-Disposition": f'inline; filename="{os.path.basename(name)}"'})
+
+
+async def export_image(model: str,
+                       img: np.ndarray,
+                       params: dict,
+                       encoding: Encoding,
+                       digest: str = None) -> dict:
+    """
+    Applies a model to a full resolution image and returns
+    the location of the result.
+    """
+    start = time.time()
+
+    # Apply the selected model, or reuse an identical earlier result
+    key, name, cached, _ = await apply_model(model, img, params, "export", digest,
+                                             encoding=encoding)
+
+    # Time tracking
+    end = time.time()
+    elapsed = end - start
+
+    # Return location of new image
+    return {"time": elapsed,
+            "output": name,
+            "url": f"/results/{key}",
+            "cached": cached}
+
+
+async def render_preview(model: str, res: np.ndarray, encoding: Encoding, digest: str = None) -> dict:
+    """
+    Applies one model to a preview thumbnail with the preview
+    timeout. Returns the model with the thumbnail location and
+    compute time, or with the reason it failed.
+    """
+    start = time.time()
+    try:
+        key, name, cached, _ = await apply_model(model, res, {}, "preview", digest,
+                                                 timeout=cfg.timeouts["preview"],
+                                                 encoding=encoding, priority="grid")
+    except asyncio.TimeoutError:
+        return {"model": model,
+                "error": f'Timed out after {cfg.timeouts["preview"]} seconds'}
+    except HTTPException as e:
+        return {"model": model, "error": e.detail}
+    except Exception as e:
+        return {"model": model, "error": repr(e)}
+
+    return {"model": model,
+            "thumb": name,
+            "url": f"/results/{key}",
+            "time": time.time() - start,
+            "cached": cached}
+
+
+async def render_previews(res: np.ndarray, encoding: Encoding, digest: str = None) -> dict:
+    """
+    Applies all models concurrently to a preview thumbnail.
+    Returns the thumbnail locations, the time every model took
+    and the models that failed or timed out.
+    """
+    start = time.time()
+    if digest is None:
+        digest = await asyncio.to_thread(image_digest, res)
+    entries = await asyncio.gather(*(render_preview(model, res, encoding, digest)
+                                     for model in cfg.models))
+
+    thumbnails = [(entry["model"], entry["thumb"]) for entry in entries if "thumb" in entry]
+    timings = {entry["model"]: entry["time"] for entry in entries if "thumb" in entry}
+    errors = {entry["model"]: entry["error"] for entry in entries if "error" in entry}
+
+    end = time.time()
+    elapsed = end - start
+
+    return {"time": elapsed,
+            "thumbs": thumbnails,
+            "timings": timings,
+            "errors": errors}
+
+
+def stream_render_previews(res: np.ndarray, encoding: Encoding, digest: str = None) -> StreamingResponse:
+    """
+    Streams the previews of all models as newline delimited
+    JSON. Every line holds the model and either its thumbnail
+    location and compute time or an error, in the order the
+    models finish. The last line holds the total time.
+    """
+    start = time.time()
+
+    async def entries():
+        preview_digest = digest or await asyncio.to_thread(image_digest, res)
+        tasks = [asyncio.create_task(render_preview(model, res, encoding, preview_digest))
+                 for model in cfg.models]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield json.dumps(await task) + "\n"
+            yield json.dumps({"time": time.time() - start}) + "\n"
+        finally:
+            # Client went away, drop models that have not started yet
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(entries(), media_type="application/x-ndjson")
+
+
+async def render_single_preview(model: str,
+                                res: np.ndarray,
+                                params: dict,
+                                encoding: Encoding,
+                                digest: str = None) -> dict:
+    """Applies one model with user-defined parameters to a preview thumbnail"""
+    start = time.time()
+
+    key, name, cached, _ = await apply_model(model, res, params, "preview", digest,
+                                             encoding=encoding)
+
+    end = time.time()
+    elapsed = end - start
+
+    return {"time": elapsed,
+            "prev": name,
+            "url": f"/results/{key}",
+            "cached": cached}
+
+
+def request_params(request: Request, kind: str) -> tuple:
+    """
+    Splits the query parameters of a request into the model
+    parameters and the output encoding ("format", "quality").
+    """
+    params = dict(request.query_params)
+    encoding = encoding_for(kind, params)
+    return param_types(params), encoding
+
+
+# Upload an image once and refer to it by session ID afterwards
+@app.post("/sessions")
+async def create_session(file: UploadFile = File(...)):
+    """
+    Receives an image via POST, decodes it and keeps
+    the full resolution image and its preview thumbnail
+    in memory. Returns the session ID to use with the
+    /sessions/{session_id}/... endpoints.
+    """
+    start = time.time()
+
+    def load() -> ImageSession:
+        # Decoding, the thumbnail and the digests of both, off the event loop
+        img = decode_image(file)
+        return ImageSession(img, preview_thumbnail(img))
+
+    session = sessions.add(await asyncio.to_thread(load))
+
+    end = time.time()
+    elapsed = end - start
+
+    return {"time": elapsed,
+            "id": session.id,
+            "shape": session.image.shape}
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Drops a session and its images"""
+    return {"removed": sessions.remove(session_id)}
+
+
 # Get an image from the frontend and apply selected model
 @app.post("/files/{model}")
-async def get_file(model: str = None, file: UploadFile = File(...)):
+async def get_file(params: Request,
+                   model: str = None,
+                   file: UploadFile = File(...)):
     """
     Receives a file as bytes object via POST.
     Processes the image with OpenCV and saves
@@ -44,61 +355,291 @@ async def get_file(model: str = None, file: UploadFile = File(...)):
     location of the processed image.
     """
     start = time.time()
-    image = np.array(Image.open(file.file))
+    img = await asyncio.to_thread(decode_image, file)
 
-    # Read image with OpenCV as RGB (instead of BGR)
-    img = cv2.cvtColor(image, cv2.cv2.COLOR_RGB2BGR)
+    # Parameter type conversion
+    params, encoding = request_params(params, "export")
 
-    # Output name
-    if not model:
-        name = f'{cfg.paths["export"]}{uuid.uuid4()}.jpg'
-    else:
-        name = f'{cfg.paths["export"]}{uuid.uuid4()}_{model}.jpg'
+    output = await export_image(model, img, params, encoding)
+    output["time"] = time.time() - start
+    return output
 
-    # Apply the selected model
-    output = cfg.models[model]["func"](img)
 
-    # Write output to storage
-    cv2.imwrite(name, output)
+@app.post("/sessions/{session_id}/files/{model}")
+async def get_session_file(session_id: str, model: str, params: Request):
+    """Same as /files/{model} for the image of a session"""
+    session = sessions.get(session_id)
+    params, encoding = request_params(params, "export")
+    return await export_image(model, session.image, params, encoding, session.digest)
 
-    # Time tracking
-    end = time.time()
-    elapsed = end - start
 
-    # Return location of new image
-    return {"time": elapsed,
-            "output": name}
+@app.post("/sessions/{session_id}/files/{model}/image")
+async def get_session_file_image(session_id: str,
+                                 model: str,
+                                 request: Request,
+                                 background: BackgroundTasks):
+    """
+    Same as /sessions/{session_id}/files/{model}, but
+    returns the encoded image with an ETag.
+    """
+    session = sessions.get(session_id)
+    params, encoding = request_params(request, "export")
+    return await image_response(model, session.image, params, encoding, "export",
+                                session.digest, request, background)
+
+
+async def process_batch_item(model: str,
+                             item: BatchItem,
+                             params: dict,
+                             encoding: Encoding,
+                             limit: asyncio.Semaphore,
+                             write: bool) -> tuple:
+    """
+    Applies a model to one image of a batch. Returns a report
+    entry with either the result or the error, and the encoded
+    result (None on errors and with write). Results stay out of
+    the memory tier of the result cache, without write they are
+    not stored at all.
+    """
+    async with limit:
+        start = time.time()
+        try:
+            # Reading a zip entry decompresses it, off the event loop as well
+            img = await asyncio.to_thread(lambda: decode_stream(item.open()))
+            key, name, cached, data = await apply_model(model, img, params, "export", write=write,
+                                                        encoding=encoding, priority="batch", keep=False)
+        except HTTPException as error:
+            return {"name": item.name, "error": error.detail}, None
+        except Exception as error:
+            return {"name": item.name, "error": repr(error)}, None
+
+    entry = {"name": item.name,
+             "time": time.time() - start,
+             "cached": cached}
+    if write:
+        entry.update(output=name, url=f"/results/{key}")
+    return entry, data
+
+
+# Apply one model to a whole folder of images
+@app.post("/batch/{model}")
+async def process_batch(model: str, request: Request, files: List[UploadFile] = File(...)):
+    """
+    Applies one model with one set of parameters (query
+    parameters, like /files/{model}) to many images: any number
+    of uploaded images, zip archives of images, or both. Up to
+    config.batch['concurrency'] images are processed at a time.
+
+    Returns a zip archive of the results, streamed as images
+    complete, with batch.json holding the per-image timings,
+    errors and the throughput. With output=ndjson the response
+    is one JSON line per image as it completes (the result is
+    linked by "url"), followed by a summary line.
+    """
+    if model not in cfg.models:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {model}")
+    params, encoding = request_params(request, "export")
+    output = params.pop("output", "zip")
+    if output not in ("zip", "ndjson"):
+        raise HTTPException(status_code=422, detail="output must be zip or ndjson")
+
+    items = await asyncio.to_thread(batch_items, files)
+    start = time.time()
+    limit = asyncio.Semaphore(cfg.batch["concurrency"])
+
+    def summary(entries: list) -> dict:
+        elapsed = time.time() - start
+        done = sum("error" not in entry for entry in entries)
+        return {"model": model,
+                "images": len(entries),
+                "failed": len(entries) - done,
+                "time": elapsed,
+                "images_per_second": done / elapsed if elapsed else 0.0}
+
+    async def chunks():
+        # Files are only written for ndjson, whose entries link them
+        tasks = [asyncio.create_task(process_batch_item(model, item, params, encoding, limit,
+                                                        write=output == "ndjson"))
+                 for item in items]
+        archive = ZipStream()
+        entries = []
+        try:
+            for task in asyncio.as_completed(tasks):
+                entry, data = await task
+                entries.append(entry)
+                if output == "ndjson":
+                    yield json.dumps(entry) + "\n"
+                elif data is not None:
+                    name = output_name(entry["name"], model, encoding.extension)
+                    yield await asyncio.to_thread(archive.add, name, data)
+
+            if output == "ndjson":
+                yield json.dumps(summary(entries)) + "\n"
+            else:
+                report = {**summary(entries), "params": params, "items": entries}
+                yield archive.add("batch.json", json.dumps(report, indent=2, default=str).encode())
+                yield archive.close()
+        finally:
+            # Client went away, drop images that have not started yet
+            for task in tasks:
+                task.cancel()
+
+    if output == "ndjson":
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+    return StreamingResponse(chunks(),
+                             media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="batch_{model}.zip"'})
+
+
+async def submit_job(model: str,
+                     img: np.ndarray,
+                     params: dict,
+                     encoding: Encoding,
+                     digest: str = None) -> dict:
+    """Queues an export of img as a job, see jobs.py"""
+    if model not in cfg.models:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {model}")
+    if digest is None:
+        digest = await asyncio.to_thread(image_digest, img)
+    params = proxy_params(model, params, img.shape)
+    key = result_key(digest, model, params, img.shape, encoding)
+    return await jobs.submit(model, img, params, encoding, key)
+
+
+# Long exports: submit a job and poll it instead of waiting for the result
+@app.post("/jobs/{model}")
+async def create_job(model: str, request: Request, file: UploadFile = File(...)):
+    """
+    Same as /files/{model}, but returns at once with a job
+    (its "id" and "status") instead of the result. Poll
+    /jobs/{id} or follow /jobs/{id}/events until the job is
+    done, its "url" then links the result.
+    """
+    img = await asyncio.to_thread(decode_image, file)
+    params, encoding = request_params(request, "export")
+    return await submit_job(model, img, params, encoding)
+
+
+@app.post("/sessions/{session_id}/jobs/{model}")
+async def create_session_job(session_id: str, model: str, request: Request):
+    """Same as /jobs/{model} for the image of a session"""
+    session = sessions.get(session_id)
+    params, encoding = request_params(request, "export")
+    return await submit_job(model, session.image, params, encoding, session.digest)
+
+
+@app.get("/jobs")
+async def list_jobs(status: str = None):
+    """The 100 most recently submitted jobs, optionally only those with a status"""
+    return {"jobs": await jobs.list(status)}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Status of a job: queued (with its "position"), running
+    (with its "stage"), done (with the result "url"), failed
+    (with the "error") or cancelled.
+    """
+    return await jobs.get(job_id)
+
+
+@app.get("/jobs/{job_id}/events")
+async def follow_job(job_id: str):
+    """
+    Streams the job as newline delimited JSON, one line
+    whenever its status changes, until it ends.
+    """
+    await jobs.get(job_id)
+    return StreamingResponse((json.dumps(job) + "\n" async for job in jobs.events(job_id)),
+                             media_type="application/x-ndjson")
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancels a queued or running job and stops its computation"""
+    return await jobs.cancel(job_id)
+
+
+# Speed and fidelity of proxy resolution execution, see proxy.py
+@app.post("/sessions/{session_id}/proxy/{model}")
+async def compare_proxy(session_id: str, model: str, params: Request):
+    """
+    Applies a model to the image of a session twice, on the
+    full image and on a proxy (the "proxy" parameter), and
+    returns both run times and the error of the proxy result.
+    Nothing is cached, both runs always compute.
+    """
+    session = sessions.get(session_id)
+    params, _ = request_params(params, "export")
+    params = proxy_params(model, params, session.image.shape)
+    if "proxy" not in params:
+        raise HTTPException(status_code=422, detail="proxy must be smaller than the image")
+    exact_params = {param: value for param, value in params.items() if param != "proxy"}
+
+    start = time.time()
+    exact = await run_model(model, session.image.copy(), **exact_params)
+    exact_time = time.time() - start
+
+    start = time.time()
+    approximate = await run_model(model, session.image.copy(), **params)
+    proxy_time = time.time() - start
+
+    return {"exact_time": exact_time,
+            "proxy_time": proxy_time,
+            "speedup": exact_time / proxy_time,
+            **await asyncio.to_thread(compare, exact, approximate)}
 
 
 # Get an image from the frontend and generate preview thumbnails
 @app.post("/previews")
-async def generate_previews(file: UploadFile = File(...)):
+async def generate_previews(request: Request, file: UploadFile = File(...)):
     """
     Receives an image via POST and applies
     all filters stored in the config file
     to a 256x256 downsized version of the
-    image. Saves all images to /preview
-    directory and returns the locations of
-    all images as list.
+    image. The models run concurrently, each
+    with a timeout. Saves all images to
+    /preview directory and returns the
+    locations of all images as list, the
+    time every model took and the models
+    that failed or timed out.
     """
-    thumbnails = []
     start = time.time()
-    image = np.array(Image.open(file.file))
+    res = await asyncio.to_thread(decode_preview, file)
+    _, encoding = request_params(request, "preview")
 
-    img = cv2.cvtColor(image, cv2.cv2.COLOR_RGB2BGR)
-    res = cv2.resize(img, (256, 256), interpolation=cv2.INTER_AREA)
+    previews = await render_previews(res, encoding)
+    previews["time"] = time.time() - start
+    return previews
 
-    for model in cfg.models:
-        name = f'{cfg.paths["preview"]}{uuid.uuid4()}_{model}.jpg'
-        output = cfg.models[model]["func"](res)
-        cv2.imwrite(name, output)
-        thumbnails.append((model, name))
 
-    end = time.time()
-    elapsed = end - start
+@app.post("/sessions/{session_id}/previews")
+async def generate_session_previews(session_id: str, request: Request):
+    """Same as /previews for the image of a session"""
+    session = sessions.get(session_id)
+    _, encoding = request_params(request, "preview")
+    return await render_previews(session.preview, encoding, session.preview_digest)
+
+
+# Same as /previews, but sends every thumbnail as soon as it is ready
+@app.post("/previews/stream")
+async def stream_previews(request: Request, file: UploadFile = File(...)):
+    """
+    Streams the previews of all filters as newline
+    delimited JSON, see stream_render_previews.
+    """
+    _, encoding = request_params(request, "preview")
+    res = await asyncio.to_thread(decode_preview, file)
+    return stream_render_previews(res, encoding)
 
-    return {"time": elapsed,
-            "thumbs": thumbnails}
+
+@app.post("/sessions/{session_id}/previews/stream")
+async def stream_session_previews(session_id: str, request: Request):
+    """Same as /previews/stream for the image of a session"""
+    session = sessions.get(session_id)
+    _, encoding = request_params(request, "preview")
+    return stream_render_previews(session.preview, encoding, session.preview_digest)
 
 
 # Create a single preview image
@@ -111,24 +652,38 @@ async def generate_preview(model: str,
     parameters.
     """
     start = time.time()
-    image = np.array(Image.open(file.file))
+    res = await asyncio.to_thread(decode_preview, file)
 
     # Parameter type conversion
-    params = dict(params.query_params)
-    params = param_types(params)
+    params, encoding = request_params(params, "preview")
 
-    img = cv2.cvtColor(image, cv2.cv2.COLOR_RGB2BGR)
-    res = cv2.resize(img, (256, 256), interpolation=cv2.INTER_AREA)
+    preview = await render_single_preview(model, res, params, encoding)
+    preview["time"] = time.time() - start
+    return preview
 
-    name = f'{cfg.paths["preview"]}/{uuid.uuid4()}_{model}.jpg'
-    output = cfg.models[model]["func"](res, **params)
-    cv2.imwrite(name, output)
 
-    end = time.time()
-    elapsed = end - start
+@app.post("/sessions/{session_id}/preview/{model}")
+async def generate_session_preview(session_id: str, model: str, params: Request):
+    """Same as /preview/{model} for the image of a session"""
+    session = sessions.get(session_id)
+    params, encoding = request_params(params, "preview")
+    return await render_single_preview(model, session.preview, params, encoding,
+                                       session.preview_digest)
 
-    return {"time": elapsed,
-            "prev": name}
+
+@app.post("/sessions/{session_id}/preview/{model}/image")
+async def generate_session_preview_image(session_id: str,
+                                         model: str,
+                                         request: Request,
+                                         background: BackgroundTasks):
+    """
+    Same as /sessions/{session_id}/preview/{model}, but
+    returns the encoded preview with an ETag.
+    """
+    session = sessions.get(session_id)
+    params, encoding = request_params(request, "preview")
+    return await image_response(model, session.preview, params, encoding, "preview",
+                                session.preview_digest, request, background)
 
 
 # Delete files from backend file system when they are no longer needed
@@ -166,3 +721,33 @@ async def cleanup(folder: str):
     # Return
     return {"time": elapsed,
             "removed": removed}
+
+
+@app.get("/executor/stats")
+async def executor_stats():
+    """Busy workers and queue wait times of every priority class"""
+    return executor.info()
+
+
+@app.get("/results/stats")
+async def result_stats():
+    """
+    Hit and miss counters and sizes of the result cache, and
+    how many computations identical requests shared
+    """
+    return {**results.info(), "single_flight": inflight.info()}
+
+
+@app.get("/results/{key}")
+async def get_result(key: str, request: Request):
+    """
+    Returns the encoded bytes of a cached result, as
+    linked by the "url" of other responses.
+    """
+    if request.headers.get("if-none-match") == f'"{key}"':
+        return Response(status_code=304, headers={"ETag": f'"{key}"'})
+
+    data = await asyncio.to_thread(results.get_data, key)
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"Unknown result: {key}")
+    return result_bytes(key, results.location(key), data)
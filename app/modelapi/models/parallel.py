@@ -0,0 +1,143 @@
+"""
+Channel and stripe parallelism inside a single model call.
+
+Many stages work on the three color channels (or on horizontal stripes
+of the image) independently and spend their time in OpenCV and numpy
+calls that release the GIL, so one image can use several cores with
+plain threads. All parallel sections draw their extra threads from one
+budget of COMPUTE_THREADS threads (default: the number of cores), which
+is shared with the process pool workers of the compute executor. Every
+running model holds one thread of it (see runCounted), so when the
+server is busy with as many requests as there are cores, the sections
+run serially in the calling thread instead of oversubscribing.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+threads = int(os.getenv('COMPUTE_THREADS', os.cpu_count() or 1))
+
+# Rows per stripe below which splitting an image does not pay off
+minStripeRows = 64
+
+
+class ThreadBudget:
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+
+    def take(self, wanted):
+        """Takes up to wanted threads without waiting, returns how many"""
+        taken = 0
+        while taken < wanted and self._semaphore.acquire(False):
+            taken += 1
+        return taken
+
+    def give(self, count):
+        for _ in range(count):
+            self._semaphore.release()
+
+
+_budget = ThreadBudget(threading.BoundedSemaphore(threads))
+_pool = None
+_poolLock = threading.Lock()
+
+
+def sharedBudget(context=multiprocessing):
+    """
+    Replaces the budget of this process with one that can be
+    shared with child processes started from the multiprocessing
+    context (see useBudget) and returns it.
+    """
+    global _budget
+    _budget = ThreadBudget(context.BoundedSemaphore(threads))
+    return _budget._semaphore
+
+
+def useBudget(semaphore):
+    """Process pool initializer, joins the budget of the parent"""
+    global _budget, _pool, _poolLock
+    _budget = ThreadBudget(semaphore)
+    # Threads of a forked parent's pool do not exist here
+    _pool = None
+    _poolLock = threading.Lock()
+
+
+def runCounted(func, *args, **kwargs):
+    """Runs func holding one thread of the budget, if one is free"""
+    # Returned to the budget it came from, even if sharedBudget replaced it meanwhile
+    budget = _budget
+    taken = budget.take(1)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        budget.give(taken)
+
+
+def _threadPool():
+    global _pool
+    with _poolLock:
+        if _pool is None:
+            # Every submitted group holds a thread of the budget, so it never waits for a worker
+            _pool = ThreadPoolExecutor(threads, thread_name_prefix="parallel")
+    return _pool
+
+
+def parallelMap(func, items, serial=None):
+    """
+    Returns [func(item) for item in items], running the calls on
+    as many threads as the budget allows. The calling thread takes
+    part, so without free threads this is a plain loop, or
+    serial(items) when given (a batched version of func).
+    """
+    items = list(items)
+    budget = _budget
+    extra = budget.take(len(items) - 1) if len(items) > 1 else 0
+    if extra == 0:
+        return [func(item) for item in items] if serial is None else list(serial(items))
+
+    try:
+        # Items split into extra + 1 interleaved groups
+        groups = [items[k::extra + 1] for k in range(extra + 1)]
+        futures = [_threadPool().submit(lambda group=group: [func(item) for item in group])
+                   for group in groups[1:]]
+        results = [[func(item) for item in groups[0]]] + [future.result() for future in futures]
+    finally:
+        budget.give(extra)
+
+    flat = [None] * len(items)
+    for k, group in enumerate(results):
+        flat[k::extra + 1] = group
+    return flat
+
+
+def perChannel(func, img, out=None):
+    """
+    Applies func to every channel of img in parallel and stacks
+    the results, or writes them into the channels of out.
+    """
+    planes = parallelMap(func, [img[:, :, k] for k in range(img.shape[2])])
+    if out is None:
+        return np.stack(planes, axis=2)
+    for k, plane in enumerate(planes):
+        out[:, :, k] = plane
+    return out
+
+
+def perStripe(func, img, out=None):
+    """
+    Applies a per-pixel func to horizontal stripes of img in
+    parallel and joins the results (into out when given).
+    """
+    stripes = max(min(threads, len(img) // minStripeRows), 1)
+    bounds = np.linspace(0, len(img), stripes + 1).astype(int)
+    parts = parallelMap(func, [img[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])])
+    if out is None:
+        return np.concatenate(parts, axis=0)
+    for start, stop, part in zip(bounds[:-1], bounds[1:], parts):
+        out[start:stop] = part
+    return out
@@ -4,7 +4,7 @@ import numpy as np
 
 from models.uwiColorRestore.helpers.adaptiveExposureMap import AdaptiveExposureMap
 from models.uwiColorRestore.helpers.adaptiveSceneRadiance import AdaptiveSceneRadiance
-from models.uwiColorRestore.helpers.getAtmosphericLight import getAtomsphericLight
+from models.uwiColorRestore.helpers.getAtmosphericLight import getAtomsphericLightMin
 from models.uwiColorRestore.helpers.determineDepth import determineDepth
 from models.uwiColorRestore.helpers.refinedTransmission import refinedtransmission
 from models.uwiColorRestore.helpers.getTransmission import getTransmission
@@ -18,7 +18,7 @@ np.seterr(invalid ='ignore')
 np.seterr(all ='ignore')
 
 
-def gbdehazingrcoorection(img):
+def gbdehazingrcoorection(img, subsample=1):
 
     img = (img - img.min()) / (img.max() - img.min()) * 255
 
@@ -26,16 +26,16 @@ def gbdehazingrcoorection(img):
 
     largestDiff = determineDepth(img, blockSize)
 
-    AtomsphericLight, AtomsphericLightGB, AtomsphericLightRGB = getAtomsphericLight(largestDiff, img)
+    AtomsphericLight, AtomsphericLightGB, AtomsphericLightRGB = getAtomsphericLightMin(largestDiff, img)
 
     transmission = getTransmission(img, AtomsphericLightRGB, blockSize)
-    transmission = refinedtransmission(transmission, img)
+    transmission = refinedtransmission(transmission, img, subsample)
 
     sceneRadiance_GB = sceneRadianceGB(img, transmission, AtomsphericLightRGB)
     sceneRadiance = sceneradiance(img, sceneRadiance_GB)
 
     # TODO: Lambda and blockSize are not used by AdaptiveExposureMap
-    S_x = AdaptiveExposureMap(img, sceneRadiance, Lambda=0.3, blockSize=blockSize)
+    S_x = AdaptiveExposureMap(img, sceneRadiance, Lambda=0.3, blockSize=blockSize, subsample=subsample)
     sceneRadiance = AdaptiveSceneRadiance(sceneRadiance, S_x)
 
     return sceneRadiance
\ No newline at end of file
@@ -2,10 +2,10 @@
 
 import cv2
 import numpy as np
-from models.uwiColorRestore.helpers.guidedfilter import GuidedFilter
+from models.uwiColorRestore.helpers.guidedfilter import getGuidedFilter
 
 
-def AdaptiveExposureMap(img, sceneRadiance, Lambda, blockSize):
+def AdaptiveExposureMap(img, sceneRadiance, Lambda, blockSize, subsample=1):
 
     minValue = 10 ** -2
     img = np.uint8(img)
@@ -24,7 +24,7 @@ def AdaptiveExposureMap(img, sceneRadiance, Lambda, blockSize):
     gimfiltR = 50
     eps = 10 ** -3
 
-    guided_filter = GuidedFilter(YiCrCb, gimfiltR, eps)
+    guided_filter = getGuidedFilter(YiCrCb, gimfiltR, eps, subsample)
 
     refinedS = guided_filter.filter(S)
 
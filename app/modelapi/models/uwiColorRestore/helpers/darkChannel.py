@@ -0,0 +1,45 @@
+"""Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration
+
+Shared min channel and dark channel for DCP, DCP_TM and LowComplexityDCP.
+"""
+
+import numpy as np
+from models.uwiColorRestore.helpers.extremumFilter import minFilter
+
+
+def getMinChannel(img):
+    """
+    Returns the per-pixel minimum over the three color
+    channels as uint8 array.
+    """
+    if len(img.shape) == 3 and img.shape[2] == 3:
+        pass
+    else:
+        print("bad image shape, input must be color image")
+        return None
+
+    return np.uint8(np.minimum(np.min(img, axis=2), 255))
+
+
+def getDarkChannel(img, blockSize):
+    """
+    Returns the minimum of every blockSize x blockSize
+    window of a single channel image. Pixels outside the
+    image count as 255.
+    """
+    if len(img.shape) == 2:
+        pass
+    else:
+        print("bad image shape, input image must be two demensions")
+        return None
+
+    if blockSize % 2 == 0 or blockSize < 3:
+        print('blockSize is not odd or too small')
+        return None
+
+    return np.uint8(minFilter(img, blockSize, padValue=255))
+
+
+def getRGBDarkChannel(img, blockSize):
+    """Dark channel of a color image"""
+    return getDarkChannel(getMinChannel(img), blockSize)
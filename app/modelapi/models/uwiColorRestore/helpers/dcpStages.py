@@ -0,0 +1,63 @@
+"""
+Cached stages shared by DCP and DCP_TM.
+
+    stage                   depends on
+    dark channel            image, blockSize
+    atmospheric light       image, blockSize, meanMode, percent
+    filtered dark channel   image, blockSize, subsample
+
+The guided filter is linear in its input and maps constant planes to
+themselves, so filtering 1 - omega * dark / A gives the same result as
+1 - omega * filter(dark) / A. Filtering the dark channel once leaves
+omega, t0 and the atmospheric light as plain arithmetic on cached
+planes, which is what the preview sliders change most.
+"""
+
+import numpy as np
+from models.uwiColorRestore.helpers.darkChannel import getDarkChannel, getMinChannel
+from models.uwiColorRestore.helpers.getAtmosphericLight import getAtomsphericLight
+from models.uwiColorRestore.helpers.guidedfilter import getGuidedFilter
+from models.uwiColorRestore.helpers.stageCache import StageCache, fingerprint
+
+gimfiltR = 50
+eps = 10 ** -3
+
+_darkChannels = StageCache(8, maxBytes=64 * 2 ** 20)
+_atmosphericLights = StageCache(32)
+# float64 planes of the image size
+_filteredDarkChannels = StageCache(4, maxBytes=256 * 2 ** 20)
+
+
+def _darkChannel(img, imgKey, blockSize):
+    return _darkChannels.get(
+        (imgKey, blockSize),
+        lambda: getDarkChannel(getMinChannel(img), blockSize=blockSize))
+
+
+def _atmosphericLight(img, imgKey, blockSize, meanMode, percent):
+    return _atmosphericLights.get(
+        (imgKey, blockSize, meanMode, percent),
+        lambda: getAtomsphericLight(_darkChannel(img, imgKey, blockSize), img,
+                                    meanMode=meanMode, percent=percent))
+
+
+def _filteredDarkChannel(img, imgKey, blockSize, subsample):
+    def compute():
+        guided_filter = getGuidedFilter(img, gimfiltR, eps, subsample)
+        return guided_filter.filter(np.float64(_darkChannel(img, imgKey, blockSize)))
+
+    return _filteredDarkChannels.get((imgKey, blockSize, subsample), compute)
+
+
+def refinedTransmission(img, omega, blockSize, meanMode, percent, subsample):
+    """
+    Returns the guided filter refined (not yet clipped) transmission
+    of img and the atmospheric light it was computed with.
+    """
+    imgKey = fingerprint(img)
+    atomsphericLight = _atmosphericLight(img, imgKey, blockSize, meanMode, percent)
+    filteredDark = _filteredDarkChannel(img, imgKey, blockSize, subsample)
+
+    transmission = 1 - omega * filteredDark / atomsphericLight
+
+    return transmission, atomsphericLight
@@ -0,0 +1,80 @@
+"""
+Tiled recipe of DCP for very large images (see tiling.py).
+
+The atmospheric light is a global statistic: the brightest percent of
+the dark channel over the whole image. The statistics pass keeps the
+best candidates of every tile (dark channel value, raster index, and
+the channel maximum and sum of the pixel), so the merged selection is
+the one getAtomsphericLight makes, ties in raster order included.
+Memory for this is proportional to percent of the image.
+
+The render pass needs the dark channel around every pixel the guided
+filter reads: the filter averages coefficients that are themselves box
+means, so a pixel depends on the dark channel up to 2 * gimfiltR away,
+and the dark channel on the image up to blockSize // 2 further.
+"""
+
+import numpy as np
+from models.uwiColorRestore.helpers.darkChannel import getDarkChannel, getMinChannel
+from models.uwiColorRestore.helpers.dcpStages import eps, gimfiltR
+from models.uwiColorRestore.helpers.getAtmosphericLight import brightestPixels
+from models.uwiColorRestore.helpers.guidedfilter import GuidedFilter
+
+
+def _darkChannel(tile, blockSize):
+    return getDarkChannel(getMinChannel(tile.data), blockSize)
+
+
+def statistics(tiles, omega, t0, blockSize, meanMode, percent, subsample):
+    grid = tiles(blockSize // 2)
+    height, width = grid.shape[:2]
+    count = int(percent * height * width)
+
+    values = np.empty(0, dtype=np.uint8)
+    indices = np.empty(0, dtype=np.int64)
+    maxima = np.empty(0, dtype=np.uint8)
+    sums = np.empty(0, dtype=np.int64)
+
+    for tile in grid:
+        dark = tile.crop(_darkChannel(tile, blockSize))
+        pixels = tile.crop(tile.data).reshape(-1, tile.data.shape[2])
+        # With a count of 0 the single brightest pixel decides
+        selected = brightestPixels(dark, max(count, 1))
+
+        rows, columns = np.divmod(selected, dark.shape[1])
+        top, left = tile.origin
+        values = np.concatenate((values, dark.ravel()[selected]))
+        indices = np.concatenate((indices, (top + rows) * width + left + columns))
+        maxima = np.concatenate((maxima, pixels[selected].max(axis=1)))
+        sums = np.concatenate((sums, pixels[selected].sum(axis=1, dtype=np.int64)))
+
+        # Best candidates so far, by descending value and then raster order
+        best = np.lexsort((indices, -values.astype(np.int64)))[:max(count, 1)]
+        values, indices, maxima, sums = values[best], indices[best], maxima[best], sums[best]
+
+    if count == 0 or not meanMode:
+        return {"atomsphericLight": max(maxima.max(), 0)}
+    return {"atomsphericLight": int(sums.sum(dtype=np.float64) / (count * 3))}
+
+
+def halo(omega, t0, blockSize, meanMode, percent, subsample):
+    # Slack for the resampling of the fast guided filter
+    return 2 * gimfiltR + blockSize // 2 + 4 * subsample
+
+
+def render(tile, stats, omega, t0, blockSize, meanMode, percent, subsample):
+    atomsphericLight = stats["atomsphericLight"]
+
+    guided_filter = GuidedFilter(tile.data, gimfiltR, eps, subsample)
+    filteredDark = guided_filter.filter(np.float64(_darkChannel(tile, blockSize)))
+
+    transmission = 1 - omega * tile.crop(filteredDark) / atomsphericLight
+    transmission = np.clip(transmission, t0, 0.9)
+
+    img = np.float64(tile.crop(tile.data))
+    sceneRadiance = (img - atomsphericLight) / transmission[:, :, np.newaxis] + atomsphericLight
+
+    sceneRadiance = np.clip(sceneRadiance, 0, 255)
+    sceneRadiance = np.uint8(sceneRadiance)
+
+    return sceneRadiance
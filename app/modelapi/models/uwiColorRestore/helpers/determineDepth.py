@@ -1,39 +1,17 @@
 """Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
 
 import numpy as np
+from models.uwiColorRestore.helpers.extremumFilter import maxFilter
 
 
 def getMAxChannel(img):
-    imgGray = np.zeros((img.shape[0], img.shape[1]), 'float32')
-    for i in range(0, img.shape[0]):
-        for j in range(0, img.shape[1]):
-            localMax = 0
-            for k in range(0, 2):
-                if img.item((i, j, k)) > localMax:
-                    localMax = img.item((i, j, k))
-            imgGray[i, j] = localMax
-    return imgGray
+    imgGray = np.fmax(np.fmax(img[:, :, 0], img[:, :, 1]), 0)
+    return np.float32(imgGray)
 
 
 def getDarkChannel(img, blockSize):
-    addSize = int((blockSize - 1) / 2)
-    newHeight = img.shape[0] + blockSize - 1
-    newWidth = img.shape[1] + blockSize - 1
-
-    imgMiddle = np.zeros((newHeight, newWidth))
-    imgMiddle[:, :] = 0
-    imgMiddle[addSize:newHeight - addSize, addSize:newWidth - addSize] = img
-    imgDark = np.zeros((img.shape[0], img.shape[1]), dtype=np.float16)
-
-    for i in range(addSize, newHeight - addSize):
-        for j in range(addSize, newWidth - addSize):
-            localMax = 0
-            for k in range(i - addSize, i + addSize + 1):
-                for l in range(j - addSize, j + addSize + 1):
-                    if imgMiddle.item((k, l)) > localMax:
-                        localMax = imgMiddle.item((k, l))
-            imgDark[i - addSize, j - addSize] = localMax
-    return imgDark
+    imgDark = np.fmax(maxFilter(np.float64(img), blockSize, padValue=0), 0)
+    return np.float16(imgDark)
 
 
 def determineDepth(img, blockSize):
@@ -43,4 +21,4 @@ def determineDepth(img, blockSize):
     Max_R  = getDarkChannel(img2[:,:,2], blockSize)
     largestDiff = Max_R  - Max_GB
 
-    return largestDiff
\ No newline at end of file
+    return largestDiff
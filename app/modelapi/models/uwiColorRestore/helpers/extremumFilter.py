@@ -0,0 +1,63 @@
+"""
+Sliding window minimum and maximum filters.
+
+Uses the van Herk/Gil-Werman algorithm: every row (and then every
+column) is cut into blocks of the window size, a running extremum is
+taken forwards and backwards inside each block, and every window is
+the extremum of one backward and one forward value. The cost per
+pixel is constant, independent of the window size.
+
+Pixels outside the image take a constant pad value (0 or 255 for the
+existing callers). NaN values are ignored (np.fmin, np.fmax), like
+the comparison loops of determineDepth's former getDarkChannel; the
+former getTransmission took np.min of every window, which returned NaN
+for any window holding one. Works on uint8 and float arrays; the first
+two axes are filtered, any further axis (color channels) is left alone.
+"""
+
+import numpy as np
+
+
+def _vanHerk(img, size, op, padValue):
+    """One-dimensional van Herk/Gil-Werman pass along the first axis"""
+    length = img.shape[0]
+
+    # Window of output i covers img[i - before, i + after]
+    before = size // 2
+    blocks = -(-(length + size - 1) // size)
+    padded = np.full((blocks * size,) + img.shape[1:], padValue, dtype=img.dtype)
+    padded[before:before + length] = img
+
+    # Running extremum forwards and backwards inside every block
+    forward = padded.reshape((blocks, size) + img.shape[1:])
+    backward = forward.copy()
+    for k in range(1, size):
+        op(forward[:, k - 1], forward[:, k], out=forward[:, k])
+        op(backward[:, size - k], backward[:, size - k - 1], out=backward[:, size - k - 1])
+    forward = forward.reshape(padded.shape)
+    backward = backward.reshape(padded.shape)
+
+    return op(backward[:length], forward[size - 1:size - 1 + length])
+
+
+def _filter(img, size, op, padValue):
+    img = np.asarray(img)
+    padValue = np.array(padValue).astype(img.dtype)
+    out = _vanHerk(img.swapaxes(0, 1), size, op, padValue).swapaxes(0, 1)
+    return _vanHerk(out, size, op, padValue)
+
+
+def minFilter(img, size, padValue=255):
+    """
+    Returns the minimum of every size x size window,
+    counting pixels outside the image as padValue.
+    """
+    return _filter(img, size, np.fmin, padValue)
+
+
+def maxFilter(img, size, padValue=0):
+    """
+    Returns the maximum of every size x size window,
+    counting pixels outside the image as padValue.
+    """
+    return _filter(img, size, np.fmax, padValue)
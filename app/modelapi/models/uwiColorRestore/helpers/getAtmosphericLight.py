@@ -1,33 +1,83 @@
-"""Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
+"""Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration
+
+Atmospheric light estimators shared by DCP, DCP_TM, LowComplexityDCP and
+GBDehazingRCorrection. The original implementations sorted one Python
+object per pixel; here the candidate pixels are found with a partial
+selection on the flat dark channel, so memory stays proportional to
+the image. Ties are resolved in raster order, like the stable sort did.
+"""
 
 import numpy as np
 
 
-class Node(object):
-    def __init__(self,x,y,value):
-        self.x = x
-        self.y = y
-        self.value = value
+def brightestPixels(darkChannel, count):
+    """
+    Returns the flat indices of the count largest dark channel
+    values, ordered by descending value and then by raster order.
+    """
+    values = darkChannel.ravel()
+    count = min(count, values.size)
+    if count <= 0:
+        return np.empty(0, dtype=np.intp)
 
-    def printInfo(self):
-        print(self.x,self.y,self.value)
+    # Value of the count-th largest pixel
+    threshold = np.partition(values, values.size - count)[values.size - count]
 
+    above = np.flatnonzero(values > threshold)
+    tied = np.flatnonzero(values == threshold)[:count - above.size]
+    selected = np.concatenate((above, tied))
 
-def getAtomsphericLight(darkChannel, img):
-    img = np.float32(img)
-    height = darkChannel.shape[0]
-    width = darkChannel.shape[1]
-    nodes = []
+    order = np.lexsort((selected, -values[selected].astype(np.float64)))
+    return selected[order]
+
+
+def getAtomsphericLight(darkChannel, img, meanMode=False, percent=0.001):
+    """
+    DCP estimate: the largest channel value (or the mean of all
+    channel values with meanMode) of the brightest percent of the
+    dark channel.
+    """
+    size = darkChannel.shape[0] * darkChannel.shape[1]
+    count = int(percent * size)
+    pixels = img.reshape(size, img.shape[2])
+
+    if count == 0:
+        top = np.argmax(darkChannel)
+        return max(pixels[top].max(), 0)
+
+    pixels = pixels[brightestPixels(darkChannel, count)]
+
+    if meanMode:
+        return int(pixels.sum(dtype=np.float64) / (count * 3))
 
-    for i in range(0, height):
-        for j in range(0, width):
-            oneNode = Node(i, j, darkChannel[i, j])
-            nodes.append(oneNode)
+    return max(pixels.max(), 0)
 
-    nodes = sorted(nodes, key=lambda node: node.value, reverse=False)
 
-    atomsphericLight = np.mean([img[nodes[0].x, nodes[0].y, 0],img[nodes[0].x, nodes[0].y, 1]])
-    atomsphericLightGB = img[nodes[0].x, nodes[0].y, 0:2]
-    atomsphericLightRGB = img[nodes[0].x, nodes[0].y, :]
+def getAtomsphericLightMaxSum(darkChannel, img, percent):
+    """
+    Low complexity DCP estimate: the color of the pixel with the
+    largest channel sum among the brightest percent of the dark
+    channel.
+    """
+    size = darkChannel.shape[0] * darkChannel.shape[1]
+    count = max(int(percent * size), 1)
+    pixels = np.float16(img.reshape(size, img.shape[2])[brightestPixels(darkChannel, count)])
+
+    sums = pixels.astype(np.float64).sum(axis=1)
+
+    return pixels[np.argmax(sums)]
+
+
+def getAtomsphericLightMin(darkChannel, img):
+    """
+    GB dehazing estimate: the color of the first pixel with the
+    smallest dark channel value.
+    """
+    img = np.float32(img)
+    x, y = np.unravel_index(np.argmin(darkChannel), darkChannel.shape)
+
+    atomsphericLight = np.mean([img[x, y, 0], img[x, y, 1]])
+    atomsphericLightGB = img[x, y, 0:2]
+    atomsphericLightRGB = img[x, y, :]
 
-    return atomsphericLight, atomsphericLightGB, atomsphericLightRGB
\ No newline at end of file
+    return atomsphericLight, atomsphericLightGB, atomsphericLightRGB
@@ -1,40 +0,0 @@
-"""Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
-
-import numpy as np
-
-
-def getMinChannel(img):
-    imgGray = np.zeros((img.shape[0],img.shape[1]),dtype = np.uint8)
-
-    for i in range(0,img.shape[0]):
-        for j in range(0,img.shape[1]):
-            localMin = 255
-            for k in range(0,3):
-                if img.item((i,j,k)) < localMin:
-                    localMin = img.item((i,j,k))
-            imgGray[i,j] = localMin
-
-    return imgGray
-
-def getDarkChannel(img, blockSize):
-    img = getMinChannel(img)
-    addSize = int((blockSize - 1) / 2)
-    newHeight = img.shape[0] + blockSize - 1
-    newWidth = img.shape[1] + blockSize - 1
-
-    imgMiddle = np.zeros((newHeight, newWidth))
-    imgMiddle[:, :] = 255
-    imgMiddle[addSize:newHeight - addSize, addSize:newWidth - addSize] = img
-
-    imgDark = np.zeros((img.shape[0], img.shape[1]), np.uint8)
-
-    for i in range(addSize, newHeight - addSize):
-        for j in range(addSize, newWidth - addSize):
-            localMin = 255
-            for k in range(i - addSize, i + addSize + 1):
-                for l in range(j - addSize, j + addSize + 1):
-                    if imgMiddle.item((k, l)) < localMin:
-                        localMin = imgMiddle.item((k, l))
-            imgDark[i - addSize, j - addSize] = localMin
-
-    return imgDark
\ No newline at end of file
@@ -1,16 +1,9 @@
 """Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
 
-import numpy as np
-import math
+from models.uwiColorRestore.helpers.extremumFilter import minFilter
 
 
 def getTransmission(normI, AtomsphericLight, w):
-    M, N, C = normI.shape
     B = AtomsphericLight
-    padwidth = math.floor(w / 2)
-    padded = np.pad(normI / B, ((padwidth, padwidth), (padwidth, padwidth), (0, 0)), 'constant')
-    transmission = np.zeros((M, N, 2))
-    for y, x in np.ndindex(M, N):
-        transmission[y, x, 0] = 1 - np.min(padded[y: y + w, x: x + w, 0])
-        transmission[y, x, 1] = 1 - np.min(padded[y: y + w, x: x + w, 1])
+    transmission = 1 - minFilter((normI / B)[:, :, 0:2], w, padValue=0)
     return transmission
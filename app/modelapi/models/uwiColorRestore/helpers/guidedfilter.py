@@ -1,24 +1,65 @@
-"""Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
+"""Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration
+
+The covariance terms of a guide image only depend on the image, the
+radius and epsilon. getGuidedFilter keeps the last few filters in an
+LRU cache keyed by a fingerprint of the guide, so repeated requests on
+the same image (slider driven previews, the transmission channels and
+the exposure map) skip the setup.
+
+With subsample s > 1 the filter runs in fast guided filter mode (He and
+Sun, 2015): the coefficients are computed on a guide and input shrunk
+by s, with the radius shrunk accordingly, and bilinearly upsampled
+before they are applied to the full resolution guide. This cuts the
+box filtering cost by about s^2 at the price of slightly softer edges.
+"""
 
 import numpy as np
 import cv2
+from models.uwiColorRestore.helpers.stageCache import StageCache, fingerprint
+
+# Every filter holds about a dozen float32 planes of the image size,
+# about 1 GB at 20 megapixels. The bound keeps preview and medium size
+# filters; full resolution exports, unlikely to be filtered again, are
+# not cached.
+_filters = StageCache(4, maxBytes=256 * 2 ** 20)
 
 
 class GuidedFilter:
 
-    def __init__(self, I, radius, epsilon):
-        self._radius = 2 * radius + 1
+    def __init__(self, I, radius, epsilon, subsample=1):
+        self._subsample = max(int(subsample), 1)
+        self._radius = 2 * max(round(radius / self._subsample), 1) + 1
         self._epsilon = epsilon
         self._I = self._toFloatImg(I)
+        self._I_low = self._downsample(self._I)
         self._initFilter()
 
+    @property
+    def nbytes(self):
+        """Bytes held by the planes of the filter"""
+        return sum(plane.nbytes for plane in vars(self).values() if isinstance(plane, np.ndarray))
+
     def _toFloatImg(self, img):
         if img.dtype == np.float32:
-            return img
+            # Copied, the filter may outlive the caller's array in the cache
+            return img.copy()
         return (1.0 / 255.0) * np.float32(img)
 
+    def _downsample(self, img):
+        if self._subsample == 1:
+            return img
+        height, width = img.shape[:2]
+        size = (max(round(width / self._subsample), 1), max(round(height / self._subsample), 1))
+        return _resize(img, size, cv2.INTER_AREA)
+
+    def _upsample(self, img):
+        if self._subsample == 1:
+            return img
+        height, width = self._I.shape[:2]
+        return _resize(img, (width, height), cv2.INTER_LINEAR)
+
     def _initFilter(self):
-        I = self._I
+        I = self._I_low
         r = self._radius
         eps = self._epsilon
 
@@ -59,37 +100,81 @@ class GuidedFilter:
 
     def _computeCoefficients(self, p):
         r = self._radius
-        I = self._I
-        Ir, Ig, Ib = I[:, :, 0], I[:, :, 1], I[:, :, 2]
+        I = self._I_low
+        p = self._downsample(p)
+        n = p.shape[2]
 
-        p_mean = cv2.blur(p, (r, r))
-        Ipr_mean = cv2.blur(Ir * p, (r, r))
-        Ipg_mean = cv2.blur(Ig * p, (r, r))
-        Ipb_mean = cv2.blur(Ib * p, (r, r))
+        # p, Ir * p, Ig * p and Ib * p of all planes in one box filter pass
+        products = np.concatenate((p, I[:, :, 0:1] * p, I[:, :, 1:2] * p, I[:, :, 2:3] * p), axis=2)
+        means = cv2.blur(products, (r, r))
+        p_mean, Ipr_mean, Ipg_mean, Ipb_mean = (means[:, :, k * n:(k + 1) * n] for k in range(4))
 
-        Ipr_cov = Ipr_mean - self._Ir_mean * p_mean
-        Ipg_cov = Ipg_mean - self._Ig_mean * p_mean
-        Ipb_cov = Ipb_mean - self._Ib_mean * p_mean
+        Ir_mean = self._Ir_mean[:, :, np.newaxis]
+        Ig_mean = self._Ig_mean[:, :, np.newaxis]
+        Ib_mean = self._Ib_mean[:, :, np.newaxis]
 
-        ar = self._Irr_inv * Ipr_cov + self._Irg_inv * Ipg_cov + self._Irb_inv * Ipb_cov
-        ag = self._Irg_inv * Ipr_cov + self._Igg_inv * Ipg_cov + self._Igb_inv * Ipb_cov
-        ab = self._Irb_inv * Ipr_cov + self._Igb_inv * Ipg_cov + self._Ibb_inv * Ipb_cov
+        Ipr_cov = Ipr_mean - Ir_mean * p_mean
+        Ipg_cov = Ipg_mean - Ig_mean * p_mean
+        Ipb_cov = Ipb_mean - Ib_mean * p_mean
 
-        b = p_mean - ar * self._Ir_mean - ag * self._Ig_mean - ab * self._Ib_mean
+        Irr_inv = self._Irr_inv[:, :, np.newaxis]
+        Irg_inv = self._Irg_inv[:, :, np.newaxis]
+        Irb_inv = self._Irb_inv[:, :, np.newaxis]
+        Igg_inv = self._Igg_inv[:, :, np.newaxis]
+        Igb_inv = self._Igb_inv[:, :, np.newaxis]
+        Ibb_inv = self._Ibb_inv[:, :, np.newaxis]
 
-        ar_mean = cv2.blur(ar, (r, r))
-        ag_mean = cv2.blur(ag, (r, r))
-        ab_mean = cv2.blur(ab, (r, r))
-        b_mean = cv2.blur(b, (r, r))
+        ar = Irr_inv * Ipr_cov + Irg_inv * Ipg_cov + Irb_inv * Ipb_cov
+        ag = Irg_inv * Ipr_cov + Igg_inv * Ipg_cov + Igb_inv * Ipb_cov
+        ab = Irb_inv * Ipr_cov + Igb_inv * Ipg_cov + Ibb_inv * Ipb_cov
 
-        return ar_mean, ag_mean, ab_mean, b_mean
+        b = p_mean - ar * Ir_mean - ag * Ig_mean - ab * Ib_mean
+
+        coefficients = cv2.blur(np.concatenate((ar, ag, ab, b), axis=2), (r, r))
+        coefficients = self._upsample(coefficients)
+        return tuple(coefficients[:, :, k * n:(k + 1) * n] for k in range(4))
 
     def _computeOutput(self, ab, I):
         ar_mean, ag_mean, ab_mean, b_mean = ab
-        Ir, Ig, Ib = I[:, :, 0], I[:, :, 1], I[:, :, 2]
+        Ir, Ig, Ib = I[:, :, 0:1], I[:, :, 1:2], I[:, :, 2:3]
         q = ar_mean * Ir + ag_mean * Ig + ab_mean * Ib + b_mean
         return q
 
-    def filter(self, p):
+    def filter_many(self, planes):
+        """
+        Filters several planes at once. Returns a list of float32
+        planes, or float64 ones when any input plane is float64.
+        """
+        dtype = np.result_type(np.float32, *planes)
+        p = np.stack([np.asarray(plane, dtype=dtype) for plane in planes], axis=2)
         ab = self._computeCoefficients(p)
-        return self._computeOutput(ab, self._I)
\ No newline at end of file
+        q = self._computeOutput(ab, self._I)
+        return [q[:, :, k] for k in range(q.shape[2])]
+
+    def filter(self, p):
+        return self.filter_many([p])[0]
+
+    def coefficients(self, planes):
+        """
+        Smoothed local affine coefficients of several planes in
+        one float32 array of shape (h, w, 4 * n): the factors of
+        guide channel 0, 1 and 2 for every plane, then the offsets.
+        """
+        p = np.stack([np.asarray(plane, dtype=np.float32) for plane in planes], axis=2)
+        return np.concatenate(self._computeCoefficients(p), axis=2)
+
+
+def _resize(img, size, interpolation):
+    """cv2.resize for any number of channels (cv2 handles at most 4 at a time)"""
+    chunks = [cv2.resize(img[:, :, k:k + 4], size, interpolation=interpolation)
+              for k in range(0, img.shape[2], 4)]
+    return np.concatenate([chunk.reshape(size[1], size[0], -1) for chunk in chunks], axis=2)
+
+
+def getGuidedFilter(I, radius, epsilon, subsample=1):
+    """
+    Returns a GuidedFilter for the guide image I, reusing the one
+    built for an identical image, radius, epsilon and subsample.
+    """
+    key = (fingerprint(I), radius, epsilon, subsample)
+    return _filters.get(key, lambda: GuidedFilter(I, radius, epsilon, subsample))
@@ -1,16 +1,20 @@
 """Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
 
 import numpy as np
-from models.uwiColorRestore.helpers.guidedfilter import GuidedFilter
+from models.parallel import parallelMap
+from models.uwiColorRestore.helpers.guidedfilter import getGuidedFilter
 
 
-def refinedtransmission(transmission, img):
+def refinedtransmission(transmission, img, subsample=1):
     gimfiltR = 50
     eps = 10 ** -3
 
-    guided_filter = GuidedFilter(img, gimfiltR, eps)
-    transmission[:, :, 0] = guided_filter.filter(transmission[:, :, 0])
-    transmission[:, :, 1] = guided_filter.filter(transmission[:, :, 1])
+    guided_filter = getGuidedFilter(img, gimfiltR, eps, subsample)
+    # Both planes share the guide setup, each filters on its own thread,
+    # or both in one batched pass when no thread is free
+    transmission[:, :, 0], transmission[:, :, 1] = parallelMap(
+        guided_filter.filter, [transmission[:, :, 0], transmission[:, :, 1]],
+        serial=guided_filter.filter_many)
     transmission = np.clip(transmission, 0.1, 0.9)
 
     return transmission
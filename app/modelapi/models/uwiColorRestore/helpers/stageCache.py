@@ -0,0 +1,72 @@
+"""
+Caches for intermediate results of the restoration models.
+
+Interactive previews call a model over and over on the same image with
+one parameter changed. The models split their work into stages and keep
+the result of every stage in a StageCache, keyed by a fingerprint of
+the input image and the parameters the stage depends on, so only the
+stages downstream of the changed parameter run again.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def fingerprint(img):
+    """Key identifying the content, shape and dtype of an image"""
+    digest = hashlib.blake2b(np.ascontiguousarray(img).data, digest_size=16).hexdigest()
+    return digest, img.shape, img.dtype.str
+
+
+class StageCache:
+    """
+    Thread safe LRU cache holding at most size results, and at
+    most maxBytes bytes of them when given. A result's size is its
+    nbytes (numpy arrays, GuidedFilter); a result larger than
+    maxBytes on its own is returned without being cached.
+    """
+
+    def __init__(self, size, maxBytes=None):
+        self._size = size
+        self._maxBytes = maxBytes
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """
+        Returns the result cached under key, calling compute() and
+        caching its result on a miss. Results are shared between
+        callers and must not be modified.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+
+        # Computed outside the lock, concurrent misses may compute twice
+        result = compute()
+        nbytes = getattr(result, "nbytes", 0)
+        if self._maxBytes is not None and nbytes > self._maxBytes:
+            return result
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries[key][1]
+            self._entries[key] = (result, nbytes)
+            self._bytes += nbytes
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size or (
+                    self._maxBytes is not None and self._bytes > self._maxBytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
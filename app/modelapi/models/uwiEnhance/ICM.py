@@ -1,15 +1,17 @@
 """Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
 
-from models.uwiEnhance.helpers.globalHistogramStretching import stretching
+from models.uwiEnhance.helpers.globalStretchingRGB import stretchingOps
+from models.uwiEnhance.helpers.pointOps import applyPerChannel, clipToUint8
 from models.uwiEnhance.helpers.sceneRadianceRGB import sceneRadianceRGB
-from models.uwiEnhance.helpers.hsvStretching import HSVStretching
+from models.uwiEnhance.helpers.colorSpaceStretching import HSVStretching
 
 
 def icm(img):
-    img = stretching(img)
+    # Stretching and the first sceneRadianceRGB fused into one table per channel
+    ops = [op.then(clipToUint8) for op in stretchingOps(img)]
+    sceneRadiance = applyPerChannel(img, ops)
 
-    sceneRadiance = sceneRadianceRGB(img)
     sceneRadiance = HSVStretching(sceneRadiance)
     sceneRadiance = sceneRadianceRGB(sceneRadiance)
 
-    return sceneRadiance
\ No newline at end of file
+    return sceneRadiance
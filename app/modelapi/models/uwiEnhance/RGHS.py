@@ -1,12 +1,14 @@
 """Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
 
-from models.uwiEnhance.helpers.labStretching import LABStretching
-from models.uwiEnhance.helpers.globalStretchingRGB import stretching
+from models.uwiEnhance.helpers.colorSpaceStretching import LABStretching
+from models.uwiEnhance.helpers.globalStretchingRGB import stretchingOps
+from models.uwiEnhance.helpers.pointOps import applyPerChannel, clipToUint8
 
 
 def rghs(img):
 
-    sceneRadiance = stretching(img)
+    # Stretching and the clip to uint8 at the start of LABStretching in one pass
+    sceneRadiance = applyPerChannel(img, [op.then(clipToUint8) for op in stretchingOps(img)])
     sceneRadiance = LABStretching(sceneRadiance)
 
-    return sceneRadiance
\ No newline at end of file
+    return sceneRadiance
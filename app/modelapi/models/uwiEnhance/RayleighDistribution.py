@@ -3,7 +3,7 @@
 import numpy as np
 from models.uwiEnhance.helpers.colorEqualisation import RGB_equalisation
 from models.uwiEnhance.helpers.globalStretchingRGB import stretching
-from models.uwiEnhance.helpers.hsvStretching_2 import HSVStretching
+from models.uwiEnhance.helpers.colorSpaceStretching import HSVPercentileStretching
 from models.uwiEnhance.helpers.rayleighDistribution import rayleighStretching
 from models.uwiEnhance.helpers.sceneRadianceRGB import sceneRadianceRGB
 
@@ -16,7 +16,7 @@ def rayleigh_distribution(img):
     sceneRadiance = stretching(sceneRadiance)
     sceneRadiance_Lower, sceneRadiance_Upper = rayleighStretching(sceneRadiance, height, width)
     sceneRadiance = (np.float64(sceneRadiance_Lower) + np.float64(sceneRadiance_Upper)) / 2
-    sceneRadiance = HSVStretching(sceneRadiance)
+    sceneRadiance = HSVPercentileStretching(sceneRadiance)
     sceneRadiance = sceneRadianceRGB(sceneRadiance)
 
     return sceneRadiance
\ No newline at end of file
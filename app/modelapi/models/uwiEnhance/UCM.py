@@ -2,7 +2,7 @@
 
 from models.uwiEnhance.helpers.colorEqualisation_3 import RGB_equalisation
 from models.uwiEnhance.helpers.globalHistogramStretching_2 import stretching
-from models.uwiEnhance.helpers.hsvStretching import HSVStretching
+from models.uwiEnhance.helpers.colorSpaceStretching import HSVStretching
 from models.uwiEnhance.helpers.sceneRadianceRGB import sceneRadianceRGB
 
 
@@ -0,0 +1,73 @@
+"""
+Channel statistics for the stretching helpers.
+
+Percentiles, the mode and the rank of the mode are read from a
+histogram of the channel instead of a sorted copy. uint8 channels use
+one bin per value. Float channels (L, S, V, equalised RGB) use a fixed
+number of bins between the channel minimum and maximum; only the bin
+holding the requested rank is partitioned, so the result is still the
+exact value a full sort would give.
+"""
+
+import numpy as np
+
+
+def _ranks(length, indices):
+    """Converts Python style indices (negative from the end) into ranks"""
+    return [index if index >= 0 else length + index for index in indices]
+
+
+def channelRange(channel):
+    """Returns the minimum and maximum of a channel"""
+    return np.min(channel), np.max(channel)
+
+
+def orderStatistics(channel, indices, bins=256):
+    """
+    Returns the values found at the given indices of the sorted
+    channel, i.e. what sorted(channel.flatten())[index] returns
+    for every index. Negative indices count from the end.
+    """
+    values = np.ravel(channel)
+    ranks = _ranks(values.size, indices)
+
+    if values.dtype == np.uint8:
+        cumulative = np.cumsum(np.bincount(values, minlength=256))
+        return [np.uint8(np.searchsorted(cumulative, rank, side="right")) for rank in ranks]
+
+    lowest, highest = channelRange(values)
+    if lowest == highest:
+        return [lowest for _ in ranks]
+
+    # Monotone mapping of values to bins, so sorted order is kept across bins
+    scale = bins / (np.float64(highest) - np.float64(lowest))
+    binIndex = np.clip((values - lowest) * scale, 0, bins - 1).astype(np.intp)
+    counts = np.bincount(binIndex, minlength=bins)
+    cumulative = np.cumsum(counts)
+
+    statistics = []
+    for rank in ranks:
+        b = np.searchsorted(cumulative, rank, side="right")
+        offset = rank - (cumulative[b] - counts[b])
+        candidates = values[binIndex == b]
+        statistics.append(np.partition(candidates, offset)[offset])
+
+    return statistics
+
+
+def channelMode(channel):
+    """
+    Returns the most frequent value of a channel (the smallest
+    one on ties) and the number of values smaller than the mode,
+    i.e. the index of its first occurrence in the sorted channel.
+    """
+    values = np.ravel(channel)
+
+    if values.dtype == np.uint8:
+        counts = np.bincount(values, minlength=256)
+        mode = np.argmax(counts)
+        return np.uint8(mode), int(counts[:mode].sum())
+
+    unique, counts = np.unique(values, return_counts=True)
+    index = np.argmax(counts)
+    return unique[index], int(counts[:index].sum())
@@ -0,0 +1,157 @@
+"""Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration
+
+LAB and HSV stretching used by RGHS, ICM, UCM and RayleighDistribution.
+
+For RGHS, ICM and UCM the color conversions run in float32 instead of skimage's float64
+rgb2lab/rgb2hsv and follow skimage's conventions (channel 0 is read as
+red, uint8 input is scaled to 0..1, hue is returned in 0..1). Lab uses
+skimage's formulas (sRGB gamma, D65 white point, clipping of negative Z
+and of the final RGB), with the gamma of uint8 input read from a table
+and the 3x3 matrices applied with cv2.transform. HSV goes through
+OpenCV.
+
+Tolerance, measured after the final cast to uint8 against the float64
+versions on skimage's astronaut, coffee and chelsea images and on 60
+synthetic 64x64 images (noise and noisy gradients): at most 1 gray
+level. How many pixels differ depends on the image: 61% (ICM) and 64%
+(UCM) of astronaut, under 3% of the other photographs, up to 96% of a
+synthetic image; RGHS under 0.1%.
+
+RayleighDistribution stretches its HSV result again, which amplifies
+such differences to up to 16 gray levels, so it keeps skimage's
+float64 rgb2hsv and hsv2rgb.
+"""
+
+import cv2
+import numpy as np
+from skimage.color import hsv2rgb, rgb2hsv
+
+from models.parallel import perStripe
+from models.uwiEnhance.helpers.globalStretching import global_stretching
+from models.uwiEnhance.helpers.globalStretchingAB import global_Stretching_ab
+from models.uwiEnhance.helpers.globalStretchingSV import global_stretching as global_stretching_SV
+
+
+def _toFloat(img):
+    """float32 copy of an image, uint8 input scaled to 0..1 like skimage's img_as_float"""
+    if img.dtype == np.uint8:
+        return img.astype(np.float32) * np.float32(1 / 255)
+    return img.astype(np.float32)
+
+
+_XYZ_FROM_RGB = np.array([[0.412453, 0.357580, 0.180423],
+                          [0.212671, 0.715160, 0.072169],
+                          [0.019334, 0.119193, 0.950227]])
+_WHITE = np.array([0.95047, 1., 1.08883])
+
+# Matrices with the reference white folded in
+_XYZN_FROM_RGB = np.float32(_XYZ_FROM_RGB / _WHITE[:, np.newaxis])
+_RGB_FROM_XYZN = np.float32(np.linalg.inv(_XYZ_FROM_RGB) * _WHITE)
+
+
+def _linearize(rgb):
+    """Inverse sRGB gamma"""
+    return np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+
+
+_LINEAR_TABLE = np.float32(_linearize(np.float32(np.arange(256) / 255)))
+
+
+def rgbToLab(img):
+    if img.dtype == np.uint8:
+        linear = cv2.LUT(np.ascontiguousarray(img), _LINEAR_TABLE)
+    else:
+        linear = np.float32(_linearize(_toFloat(img)))
+
+    xyz = cv2.transform(linear, _XYZN_FROM_RGB)
+
+    mask = xyz > 0.008856
+    f = np.float32(7.787) * xyz + np.float32(16 / 116)
+    np.copyto(f, np.cbrt(xyz), where=mask)
+
+    lab = np.empty_like(f)
+    lab[:, :, 0] = 116 * f[:, :, 1] - 16
+    lab[:, :, 1] = 500 * (f[:, :, 0] - f[:, :, 1])
+    lab[:, :, 2] = 200 * (f[:, :, 1] - f[:, :, 2])
+    return lab
+
+
+def labToRgb(lab):
+    lab = lab.astype(np.float32)
+    f = np.empty_like(lab)
+    f[:, :, 1] = (lab[:, :, 0] + 16) / 116
+    f[:, :, 0] = lab[:, :, 1] / 500 + f[:, :, 1]
+    f[:, :, 2] = np.maximum(f[:, :, 1] - lab[:, :, 2] / 200, 0)
+
+    mask = f > 0.2068966
+    xyz = (f - np.float32(16 / 116)) * np.float32(1 / 7.787)
+    np.copyto(xyz, f * f * f, where=mask)
+
+    rgb = cv2.transform(xyz, _RGB_FROM_XYZN)
+
+    mask = rgb > 0.0031308
+    gamma = cv2.pow(np.maximum(rgb, np.float32(0.0031308)), 1 / 2.4) * np.float32(1.055) - np.float32(0.055)
+    rgb *= np.float32(12.92)
+    np.copyto(rgb, gamma, where=mask)
+    return np.clip(rgb, 0, 1, out=rgb)
+
+
+def rgbToHsv(img):
+    hsv = cv2.cvtColor(_toFloat(img), cv2.COLOR_RGB2HSV)
+    hsv[:, :, 0] *= np.float32(1 / 360)
+    return hsv
+
+
+def hsvToRgb(hsv):
+    hsv = hsv.astype(np.float32)
+    hsv[:, :, 0] = (hsv[:, :, 0] % 1) * 360
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
+
+
+def LABStretching(sceneRadiance, lRange=None):
+    """
+    RGHS: stretches L to its full range (or from the given
+    (minimum, maximum) of L) and boosts a and b
+    """
+    sceneRadiance = np.clip(sceneRadiance, 0, 255)
+    sceneRadiance = np.uint8(sceneRadiance)
+    height = len(sceneRadiance)
+    width = len(sceneRadiance[0])
+
+    # The conversions are per pixel, stripes of the image run in parallel
+    img_lab = perStripe(rgbToLab, sceneRadiance)
+    img_lab[:, :, 0] = global_stretching(img_lab[:, :, 0], height, width, lRange)
+    img_lab[:, :, 1] = global_Stretching_ab(img_lab[:, :, 1], height, width)
+    img_lab[:, :, 2] = global_Stretching_ab(img_lab[:, :, 2], height, width)
+    img_rgb = np.float64(perStripe(labToRgb, img_lab)) * 255
+
+    return img_rgb
+
+
+def HSVStretching(sceneRadiance):
+    """ICM and UCM: stretches S and V to their full range"""
+    height = len(sceneRadiance)
+    width = len(sceneRadiance[0])
+
+    img_hsv = rgbToHsv(sceneRadiance)
+    img_hsv[:, :, 1] = global_stretching(img_hsv[:, :, 1], height, width)
+    img_hsv[:, :, 2] = global_stretching(img_hsv[:, :, 2], height, width)
+    img_rgb = np.float64(hsvToRgb(img_hsv)) * 255
+
+    return img_rgb
+
+
+def HSVPercentileStretching(sceneRadiance):
+    """RayleighDistribution: stretches S and V between their 1% and 99% percentiles"""
+    sceneRadiance = np.clip(sceneRadiance, 0, 255)
+    sceneRadiance = np.uint8(sceneRadiance)
+    height = len(sceneRadiance)
+    width = len(sceneRadiance[0])
+
+    # float64 conversions, see above; per pixel, so stripes run in parallel
+    img_hsv = perStripe(rgb2hsv, sceneRadiance)
+    img_hsv[:, :, 1] = global_stretching_SV(img_hsv[:, :, 1], height, width)
+    img_hsv[:, :, 2] = global_stretching_SV(img_hsv[:, :, 2], height, width)
+    img_rgb = perStripe(hsv2rgb, img_hsv) * 255
+
+    return img_rgb
@@ -1,18 +1,8 @@
 """Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
 
-import numpy as np
+from models.uwiEnhance.helpers.globalStretchingRGB import stretchingOps
+from models.uwiEnhance.helpers.pointOps import applyPerChannel
 
 
 def stretching(img):
-    height = len(img)
-    width = len(img[0])
-
-    for k in range(0, 3):
-        Max_channel = np.max(img[:,:,k])
-        Min_channel = np.min(img[:,:,k])
-
-        for i in range(height):
-            for j in range(width):
-                img[i,j,k] = (img[i,j,k] - Min_channel) * (255 - 0) / (Max_channel - Min_channel)+ 0
-
-    return img
+    return applyPerChannel(img, stretchingOps(img), out=img)
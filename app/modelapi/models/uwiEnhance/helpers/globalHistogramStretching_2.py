@@ -2,78 +2,54 @@
 
 import numpy as np
 
+from models.uwiEnhance.helpers.channelStatistics import orderStatistics
+from models.uwiEnhance.helpers.pointOps import PointOp
 
-def histogram_r(r_array, height, width):
+
+def _limits(r_array, height, width):
     length = height * width
-    R_rray = []
-    for i in range(height):
-        for j in range(width):
-            R_rray.append(r_array[i][j])
-    R_rray.sort()
-    I_min = int(R_rray[int(length / 500)])
-    I_max = int(R_rray[-int(length / 500)])
-    array_Global_histogram_stretching = np.zeros((height, width))
-    for i in range(0, height):
-        for j in range(0, width):
-            if r_array[i][j] < I_min:
-                array_Global_histogram_stretching[i][j] = I_min
-            elif (r_array[i][j] > I_max):
-                p_out = r_array[i][j]
-                array_Global_histogram_stretching[i][j] = 255
-            else:
-                p_out = int((r_array[i][j] - I_min) * ((255 - I_min) / (I_max - I_min))) + I_min
-                array_Global_histogram_stretching[i][j] = p_out
-    return (array_Global_histogram_stretching)
+    I_min, I_max = orderStatistics(r_array, [int(length / 500), -int(length / 500)])
+    return int(I_min), int(I_max)
+
+
+def _scale(top, I_min, I_max):
+    return top / (I_max - I_min) if I_max != I_min else 0
+
+
+def histogram_r(r_array, height, width):
+    I_min, I_max = _limits(r_array, height, width)
+    scale = _scale(255 - I_min, I_min, I_max)
+
+    def stretch(values):
+        values = values.astype(np.float64)
+        p_out = np.trunc((values - I_min) * scale) + I_min
+        return np.where(values < I_min, I_min, np.where(values > I_max, 255, p_out))
+
+    return PointOp(stretch).apply(r_array)
 
 
 def histogram_g(r_array, height, width):
-    length = height * width
-    R_rray = []
-    for i in range(height):
-        for j in range(width):
-            R_rray.append(r_array[i][j])
-    R_rray.sort()
-    I_min = int(R_rray[int(length / 500)])
-    I_max = int(R_rray[-int(length / 500)])
-    array_Global_histogram_stretching = np.zeros((height, width))
-    for i in range(0, height):
-        for j in range(0, width):
-            if r_array[i][j] < I_min:
-                p_out = r_array[i][j]
-                array_Global_histogram_stretching[i][j] = 0
-            elif (r_array[i][j] > I_max):
-                p_out = r_array[i][j]
-                array_Global_histogram_stretching[i][j] = 255
-            else:
-                p_out = int((r_array[i][j] - I_min) * ((255) / (I_max - I_min)))
-                array_Global_histogram_stretching[i][j] = p_out
-    return (array_Global_histogram_stretching)
+    I_min, I_max = _limits(r_array, height, width)
+    scale = _scale(255, I_min, I_max)
+
+    def stretch(values):
+        values = values.astype(np.float64)
+        p_out = np.trunc((values - I_min) * scale)
+        return np.where(values < I_min, 0, np.where(values > I_max, 255, p_out))
+
+    return PointOp(stretch).apply(r_array)
 
 
 def histogram_b(r_array, height, width):
-    length = height * width
-    R_rray = []
-
-    for i in range(height):
-        for j in range(width):
-            R_rray.append(r_array[i][j])
-
-    R_rray.sort()
-    I_min = int(R_rray[int(length / 500)])
-    I_max = int(R_rray[-int(length / 500)])
-    array_Global_histogram_stretching = np.zeros((height, width))
-
-    for i in range(0, height):
-        for j in range(0, width):
-            if r_array[i][j] < I_min:
-                array_Global_histogram_stretching[i][j] = 0
-            elif (r_array[i][j] > I_max):
-                array_Global_histogram_stretching[i][j] = I_max
-            else:
-                p_out = int((r_array[i][j] - I_min) * ((I_max) / (I_max - I_min)))
-                array_Global_histogram_stretching[i][j] = p_out
-
-    return (array_Global_histogram_stretching)
+    I_min, I_max = _limits(r_array, height, width)
+    scale = _scale(I_max, I_min, I_max)
+
+    def stretch(values):
+        values = values.astype(np.float64)
+        p_out = np.trunc((values - I_min) * scale)
+        return np.where(values < I_min, 0, np.where(values > I_max, I_max, p_out))
+
+    return PointOp(stretch).apply(r_array)
 
 
 def stretching(img):
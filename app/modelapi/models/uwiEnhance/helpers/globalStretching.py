@@ -1,18 +1,8 @@
 """Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
 
-import numpy as np
+from models.uwiEnhance.helpers.channelStatistics import channelRange
 
 
-def global_stretching(img_L, height, width):
-    I_min = np.min(img_L)
-    I_max = np.max(img_L)
-    # TODO: Confirm this is safe to remove
-    I_mean = np.mean(img_L)
-    array_Global_histogram_stretching_L = np.zeros((height, width))
-
-    for i in range(0, height):
-        for j in range(0, width):
-            p_out = (img_L[i][j] - I_min) * ((1) / (I_max - I_min))
-            array_Global_histogram_stretching_L[i][j] = p_out
-
-    return array_Global_histogram_stretching_L
+def global_stretching(img_L, height, width, I_range=None):
+    I_min, I_max = channelRange(img_L) if I_range is None else I_range
+    return (img_L - I_min) * (1 / (I_max - I_min))
@@ -2,14 +2,13 @@
 
 import numpy as np
 
+from models.uwiEnhance.helpers.channelStatistics import orderStatistics
+
 
 def global_stretching(img_L, height, width):
     length = height * width
-    R_rray = (np.copy(img_L)).flatten()
-    R_rray.sort()
-
-    I_min = int(R_rray[int(length / 100)])
-    I_max = int(R_rray[-int(length / 100)])
+    I_min, I_max = orderStatistics(img_L, [int(length / 100), -int(length / 100)])
+    I_min, I_max = int(I_min), int(I_max)
 
     array_Global_histogram_stretching_L = np.zeros((height, width))
 
@@ -2,14 +2,24 @@
 
 import numpy as np
 
+from models.uwiEnhance.helpers.channelStatistics import channelRange
+from models.uwiEnhance.helpers.pointOps import PointOp, applyPerChannel
+
+
+def stretchingOps(img, ranges=None):
+    """
+    One PointOp per channel stretching its range to 0..255.
+    ranges holds the (minimum, maximum) of every channel when
+    they are already known, e.g. for the tiles of a larger image.
+    """
+    if ranges is None:
+        ranges = [channelRange(img[:, :, k]) for k in range(0, 3)]
+    ops = []
+    for Min_channel, Max_channel in ranges:
+        ops.append(PointOp(lambda values, low=Min_channel, high=Max_channel:
+                           (values - low).astype(np.float64) * 255 / (high - low)))
+    return ops
+
 
 def stretching(img):
-    height = len(img)
-    width = len(img[0])
-    for k in range(0, 3):
-        Max_channel = np.max(img[:, :, k])
-        Min_channel = np.min(img[:, :, k])
-        for i in range(height):
-            for j in range(width):
-                img[i, j, k] = (img[i, j, k] - Min_channel) * (255 - 0) / (Max_channel - Min_channel) + 0
-    return img
+    return applyPerChannel(img, stretchingOps(img), out=img)
@@ -1,25 +0,0 @@
-"""Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
-
-import cv2
-from skimage.color import rgb2hsv, hsv2rgb
-import numpy as np
-
-from models.uwiEnhance.helpers.globalStretching import global_stretching
-
-
-def HSVStretching(sceneRadiance):
-    height = len(sceneRadiance)
-    width = len(sceneRadiance[0])
-    img_hsv = rgb2hsv(sceneRadiance)
-
-    h, s, v = cv2.split(img_hsv)
-    img_s_stretching = global_stretching(s, height, width)
-    img_v_stretching = global_stretching(v, height, width)
-
-    labArray = np.zeros((height, width, 3), 'float64')
-    labArray[:, :, 0] = h
-    labArray[:, :, 1] = img_s_stretching
-    labArray[:, :, 2] = img_v_stretching
-    img_rgb = hsv2rgb(labArray) * 255
-
-    return img_rgb
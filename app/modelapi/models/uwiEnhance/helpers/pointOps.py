@@ -0,0 +1,80 @@
+"""
+Point operation compiler for the enhancement pipelines.
+
+A PointOp is a chain of per-pixel functions. On uint8 input the chain
+is evaluated once for the 256 possible values and applied to the image
+with a single cv2.LUT pass, so consecutive stages (e.g. stretch, clip,
+cast to uint8) read and write the image once. On any other input the
+chain runs as whole-array numpy expressions.
+
+Functions in a chain receive arrays of the input dtype and must give
+the same result for the 256-value table as for the full image.
+"""
+
+import cv2
+import numpy as np
+
+
+class PointOp:
+
+    def __init__(self, *funcs):
+        self.funcs = funcs
+
+    def then(self, other):
+        """Returns a new PointOp running other after this one"""
+        if isinstance(other, PointOp):
+            return PointOp(*self.funcs, *other.funcs)
+        return PointOp(*self.funcs, other)
+
+    def __call__(self, values):
+        for func in self.funcs:
+            values = func(values)
+        return values
+
+    def table(self, dtype=None):
+        """Lookup table of the chain for all uint8 values"""
+        table = self(np.arange(256, dtype=np.uint8))
+        if dtype is not None:
+            table = _cast(table, dtype)
+        return table
+
+    def apply(self, channel, dtype=None):
+        """Applies the chain to a single channel"""
+        return applyPerChannel(channel[:, :, np.newaxis], [self], dtype)[:, :, 0]
+
+
+def _cast(values, dtype):
+    if np.dtype(dtype) == np.uint8 and values.dtype != np.uint8:
+        # Only entries outside 0..255 are affected, which no pixel looks up
+        values = np.clip(values, 0, 255)
+    return values.astype(dtype)
+
+
+def applyPerChannel(img, ops, dtype=None, out=None):
+    """
+    Applies one PointOp per channel of img. The result is cast
+    to dtype (the dtype of out when given, otherwise whatever the
+    chains return) and written to out when given.
+    """
+    if out is not None:
+        dtype = out.dtype
+
+    if img.dtype == np.uint8:
+        tables = np.stack([op.table(dtype) for op in ops], axis=-1)
+        tables = tables.reshape(256, 1, len(ops))
+        if out is not None and out.flags.c_contiguous:
+            return cv2.LUT(img, tables, dst=out)
+        result = cv2.LUT(img, tables).reshape(img.shape)
+    else:
+        result = np.stack([op(img[:, :, k]) for k, op in enumerate(ops)], axis=-1)
+        if dtype is not None:
+            result = result.astype(dtype)
+
+    if out is not None:
+        out[...] = result
+        return out
+    return result
+
+
+# Final stage of most pipelines, see sceneRadianceRGB
+clipToUint8 = PointOp(lambda values: np.uint8(np.clip(values, 0, 255)))
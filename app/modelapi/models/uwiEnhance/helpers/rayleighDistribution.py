@@ -2,36 +2,21 @@
 
 import numpy as np
 import math
+from models.parallel import parallelMap
 
 e = np.e
 esp = 2.2204e-16
 
 
-class NodeLower(object):
-    def __init__(self,x,y,value):
-        self.x = x
-        self.y = y
-        self.value = value
-    def printInfo(self):
-        print(self.x,self.y,self.value)
-
-
-class Node(object):
-    def __init__(self,x,y,value):
-        self.x = x
-        self.y = y
-        self.value = value
-    def printInfo(self):
-        print(self.x,self.y,self.value)
-
-def rayleighStrLower(nodes, height, width,lower_Position):
+def rayleighStr(NumPixel, size):
+    """
+    Rayleigh CDF mapping for a 256-bin histogram of size pixels.
+    Returns the stretched value of every pixel level.
+    """
     alpha = 0.4
     selectedRange = [0, 255]
-    NumPixel = np.zeros(256)
     temp = np.zeros(256)
-    for i in range(0, lower_Position):
-        NumPixel[nodes[i].value] = NumPixel[nodes[i].value] + 1
-    ProbPixel = NumPixel / lower_Position
+    ProbPixel = NumPixel / size
     CumuPixel = np.cumsum(ProbPixel)
 
     valSpread = selectedRange[1] - selectedRange[0]
@@ -50,92 +35,43 @@ def rayleighStrLower(nodes, height, width,lower_Position):
             CumuPixel[i] = 255
         else:
             CumuPixel[i] = normalization
-    for i in range(0, lower_Position):
-        nodes[i].value = CumuPixel[nodes[i].value]
-    return nodes
-
-
-def rayleighStrUpper(nodes, height, width,lower_Position):
-    allSize = height*width
-    alpha = 0.4
-    selectedRange = [0, 255]
-    NumPixel = np.zeros(256)
-    temp = np.zeros(256)
-    for i in range(lower_Position, allSize):
-        NumPixel[nodes[i].value] = NumPixel[nodes[i].value] + 1
-    ProbPixel = NumPixel / (allSize-lower_Position)
-    CumuPixel = np.cumsum(ProbPixel)
-    valSpread = selectedRange[1] - selectedRange[0]
-    hconst = 2 * alpha ** 2
-    vmax = 1 - e ** (-1 / hconst)
-    val = vmax * (CumuPixel)
-    val = np.array(val)
-
-    for i in range(256):
-        if (val[i] >= 1):
-            val[i] = val[i] - esp
-    for i in range(256):
-        temp[i] = np.sqrt(-hconst * math.log((1 - val[i]), e))
-        normalization = temp[i] * valSpread
-        if(normalization > 255):
-            CumuPixel[i] = 255
-        else:
-            CumuPixel[i] = normalization
-    for i in range(lower_Position, allSize):
-        nodes[i].value = CumuPixel[nodes[i].value]
-    return nodes
+    return CumuPixel
 
 
 def uperLower(r, height, width):
     allSize = height * width
-    R_max = np.max(r)
-    R_min = np.min(r)
-    R__middle = (R_max - R_min) / 2 + R_min
+    values = np.ravel(r)
     R__middle = np.mean(r)
-    node_upper = []
-    node_lower = []
-    for i in range(0, height):
-        for j in range(0, width):
-            oneNode = Node(i, j, r[i, j])
-            oneNodeLower = NodeLower(i, j, r[i, j])
-            node_upper.append(oneNode)
-            node_lower.append(oneNodeLower)
-    node_upper = sorted(node_upper, key=lambda node: node.value, reverse=False)
-    node_lower = sorted(node_lower, key=lambda node: node.value, reverse=False)
-
-    for i in range(allSize):
-        if (node_upper[i].value > R__middle):
-            middle_Position = i
-            break
-    lower_Position = middle_Position
-
-
-    for i in range(allSize):
-        node_upper[i].value = np.int(node_upper[i].value)
-        node_lower[i].value = np.int(node_lower[i].value)
-
-    nodesLower  = rayleighStrLower(node_lower, height, width,lower_Position)
-    nodesUpper  = rayleighStrUpper(node_upper, height, width,lower_Position)
-
-    array_lower_histogram_stretching = np.zeros((height, width))
-    array_upper_histogram_stretching = np.zeros((height, width))
-
-
-    for i in range(0, allSize):
-        if(i > lower_Position):
-            array_upper_histogram_stretching[nodesUpper[i].x, nodesUpper[i].y] = nodesUpper[i].value
-            array_lower_histogram_stretching[nodesUpper[i].x, nodesUpper[i].y] = 255
-        else:
-            array_lower_histogram_stretching[nodesLower[i].x, nodesLower[i].y] = nodesLower[i].value
-            array_upper_histogram_stretching[nodesLower[i].x, nodesLower[i].y] = 0
 
-    return array_lower_histogram_stretching,array_upper_histogram_stretching
+    # Pixels above the channel mean are stretched by the upper distribution
+    upper = values > R__middle
+    lower_Position = allSize - np.count_nonzero(upper)
+    levels = np.trunc(values).astype(np.intp)
+
+    lowerMap = rayleighStr(np.bincount(levels[~upper], minlength=256), lower_Position)
+    upperMap = rayleighStr(np.bincount(levels[upper], minlength=256), allSize - lower_Position)
+
+    array_lower_histogram_stretching = np.where(upper, 255, lowerMap[levels])
+    array_upper_histogram_stretching = np.where(upper, upperMap[levels], 0)
+
+    # The first pixel above the mean (in sorted order) keeps its own level
+    # in the lower image and 0 in the upper image, as in the original
+    first = np.flatnonzero(values == values[upper].min())[0]
+    array_lower_histogram_stretching[first] = levels[first]
+    array_upper_histogram_stretching[first] = 0
+
+    return (array_lower_histogram_stretching.reshape(height, width),
+            array_upper_histogram_stretching.reshape(height, width))
+
 
 def rayleighStretching(sceneRadiance, height, width):
 
-    R_array_lower_histogram_stretching, R_array_upper_histogram_stretching = uperLower(sceneRadiance[:, :, 2], height, width)
-    G_array_lower_histogram_stretching, G_array_upper_histogram_stretching = uperLower(sceneRadiance[:, :, 1], height, width)
-    B_array_lower_histogram_stretching, B_array_upper_histogram_stretching = uperLower(sceneRadiance[:, :, 0], height, width)
+    # Channels are independent
+    ((R_array_lower_histogram_stretching, R_array_upper_histogram_stretching),
+     (G_array_lower_histogram_stretching, G_array_upper_histogram_stretching),
+     (B_array_lower_histogram_stretching, B_array_upper_histogram_stretching)) = parallelMap(
+        lambda channel: uperLower(channel, height, width),
+        [sceneRadiance[:, :, 2], sceneRadiance[:, :, 1], sceneRadiance[:, :, 0]])
 
     sceneRadiance_Lower = np.zeros((height, width, 3), )
     sceneRadiance_Lower[:, :, 0] = B_array_lower_histogram_stretching
@@ -150,6 +86,3 @@ def rayleighStretching(sceneRadiance, height, width):
     sceneRadiance_Upper = np.uint8(sceneRadiance_Upper)
 
     return sceneRadiance_Lower, sceneRadiance_Upper
-
-
-
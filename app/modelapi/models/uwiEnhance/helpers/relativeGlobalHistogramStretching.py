@@ -3,6 +3,7 @@
 import math
 import numpy as np
 
+from models.uwiEnhance.helpers.channelStatistics import orderStatistics
 from models.uwiEnhance.helpers.stretchRange import stretchrange
 
 pi = math.pi
@@ -11,13 +12,7 @@ e = math.e
 
 def global_stretching(r_array, height, width, lamda, k):
     length = height * width
-    R_rray = []
-    for i in range(height):
-        for j in range(width):
-            R_rray.append(r_array[i][j])
-    R_rray.sort()
-    I_min = R_rray[int(length / 200)]
-    I_max = R_rray[-int(length / 200)]
+    I_min, I_max = orderStatistics(r_array, [int(length / 200), -int(length / 200)])
 
     array_Global_histogram_stretching = np.zeros((height, width))
     d = 4
@@ -0,0 +1,53 @@
+"""
+Tiled recipe of RGHS for very large images (see tiling.py).
+
+RGHS is a chain of point operations with two global statistics: the
+range of every RGB channel, and the range of L after the RGB stretch.
+Two statistics passes collect them, the render pass then gives the
+same pixels as rghs on the whole image. The output is rounded to uint8
+(the encoders do the same with the float64 output of rghs), float64
+planes of a whole mosaic are what tiling avoids.
+"""
+
+import numpy as np
+
+from models.uwiEnhance.helpers.channelStatistics import channelRange
+from models.uwiEnhance.helpers.colorSpaceStretching import LABStretching, rgbToLab
+from models.uwiEnhance.helpers.globalStretchingRGB import stretchingOps
+from models.uwiEnhance.helpers.pointOps import applyPerChannel, clipToUint8
+
+
+def _merge(ranges):
+    """Overall (minimum, maximum) of (minimum, maximum) pairs"""
+    return min(low for low, _ in ranges), max(high for _, high in ranges)
+
+
+def _stretchingOps(tile, stats):
+    return [op.then(clipToUint8) for op in stretchingOps(tile.data, stats["channelRanges"])]
+
+
+def statistics(tiles):
+    channelRanges = [[] for _ in range(3)]
+    for tile in tiles(0):
+        for k in range(3):
+            channelRanges[k].append(channelRange(tile.data[:, :, k]))
+    stats = {"channelRanges": [_merge(ranges) for ranges in channelRanges]}
+
+    lRanges = []
+    for tile in tiles(0):
+        lab = rgbToLab(applyPerChannel(tile.data, _stretchingOps(tile, stats)))
+        lRanges.append(channelRange(lab[:, :, 0]))
+    stats["lRange"] = _merge(lRanges)
+
+    return stats
+
+
+def halo():
+    return 0
+
+
+def render(tile, stats):
+    sceneRadiance = applyPerChannel(tile.data, _stretchingOps(tile, stats))
+    sceneRadiance = LABStretching(sceneRadiance, stats["lRange"])
+
+    return np.uint8(np.rint(sceneRadiance))
@@ -1,12 +1,13 @@
 """Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
 
 import cv2
+from models.parallel import perChannel
 
 
 def RecoverCLAHE(sceneRadiance):
-    clahe = cv2.createCLAHE(clipLimit=2, tileGridSize=(4, 4))
-    for i in range(3):
+    def apply(channel):
+        # One CLAHE object per thread
+        clahe = cv2.createCLAHE(clipLimit=2, tileGridSize=(4, 4))
+        return clahe.apply(channel)
 
-        sceneRadiance[:, :, i] = clahe.apply((sceneRadiance[:, :, i]))
-
-    return sceneRadiance
+    return perChannel(apply, sceneRadiance, out=sceneRadiance)
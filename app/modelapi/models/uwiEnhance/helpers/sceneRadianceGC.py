@@ -2,14 +2,16 @@
 
 import numpy as np
 
+from models.uwiEnhance.helpers.pointOps import PointOp, applyPerChannel, clipToUint8
 
-def RecoverGC(sceneRadiance):
-    sceneRadiance = sceneRadiance/255.0
 
+def RecoverGC(sceneRadiance):
+    ops = []
     for i in range(3):
-        sceneRadiance[:, :, i] =  np.power(sceneRadiance[:, :, i] / float(np.max(sceneRadiance[:, :, i])), 0.7)
-
-    sceneRadiance = np.clip(sceneRadiance*255, 0, 255)
-    sceneRadiance = np.uint8(sceneRadiance)
+        channelMax = float(np.max(sceneRadiance[:, :, i]) / 255.0)
+        gamma = PointOp(lambda values: values / 255.0,
+                        lambda values, m=channelMax: np.power(values / m, 0.7),
+                        lambda values: values * 255)
+        ops.append(gamma.then(clipToUint8))
 
-    return sceneRadiance
\ No newline at end of file
+    return applyPerChannel(sceneRadiance, ops)
@@ -1,11 +1,9 @@
 """Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
 
 import cv2
+from models.parallel import perChannel
 
 
 def RecoverHE(sceneRadiance):
 
-    for i in range(3):
-        sceneRadiance[:, :, i] = cv2.equalizeHist(sceneRadiance[:, :, i])
-
-    return sceneRadiance
+    return perChannel(cv2.equalizeHist, sceneRadiance, out=sceneRadiance)
@@ -1,11 +1,7 @@
 """Source: https://github.com/wangyanckxx/Single-Underwater-Image-Enhancement-and-Color-Restoration"""
 
-import numpy as np
+from models.uwiEnhance.helpers.pointOps import clipToUint8
 
 
 def sceneRadianceRGB(sceneRadiance):
-
-    sceneRadiance = np.clip(sceneRadiance, 0, 255)
-    sceneRadiance = np.uint8(sceneRadiance)
-
-    return sceneRadiance
\ No newline at end of file
+    return clipToUint8(sceneRadiance)
@@ -0,0 +1,104 @@
+"""
+Proxy resolution execution.
+
+UCM, RGHS and the Rayleigh stretch apply a global or spatially smooth
+color transform, so their output is well described by a local affine
+map of the input colors. Models offering a "proxy" parameter in
+config.models can run on a copy of the image shrunk to the requested
+long side instead; a guided filter (guidance image: the proxy input, filtered
+planes: the proxy output) fits the per-pixel affine coefficients, which
+are bilinearly upsampled and applied to the full resolution image
+(guided upsampling). On 20 MP images the model then costs as much as on
+a preview plus a few passes over the full image.
+
+Proxy results are approximations and are cached separately from exact
+ones. The /sessions/{session_id}/proxy/{model} endpoint runs both and
+reports the speedup and the error of the proxy result.
+"""
+
+import cv2
+import numpy as np
+from fastapi import HTTPException
+
+import config as cfg
+from models.uwiColorRestore.helpers.guidedfilter import GuidedFilter
+
+
+def proxy_params(model: str, params: dict, shape: tuple) -> dict:
+    """
+    Validates the "proxy" parameter of a model call. Returns the
+    parameters without it when the image is not larger than the
+    proxy, so such requests share the exact result.
+    """
+    proxy = params.get("proxy", 0)
+    if not proxy:
+        params = dict(params)
+        params.pop("proxy", None)
+        return params
+    if "proxy" not in cfg.models[model]["params"]:
+        raise HTTPException(status_code=422, detail=f"{model} does not support proxy execution")
+    if proxy < cfg.proxy["min_size"]:
+        raise HTTPException(status_code=422,
+                            detail=f"proxy must be at least {cfg.proxy['min_size']} pixels")
+    if proxy >= max(shape[:2]):
+        params = dict(params)
+        del params["proxy"]
+    return params
+
+
+def _proxy_image(img: np.ndarray, size: int) -> np.ndarray:
+    height, width = img.shape[:2]
+    scale = size / max(height, width)
+    return cv2.resize(img, (max(round(width * scale), 1), max(round(height * scale), 1)),
+                      interpolation=cv2.INTER_AREA)
+
+
+def apply_coefficients(img: np.ndarray, coefficients: np.ndarray) -> np.ndarray:
+    """
+    Applies low resolution affine coefficients (see
+    GuidedFilter.coefficients, for a guide scaled to [0, 1]) to a
+    uint8 image. Coefficient planes are upsampled one at a time,
+    all of them at once would take GBs on a 20 MP image.
+    """
+    height, width = img.shape[:2]
+    n = coefficients.shape[2] // 4
+    guide = cv2.split(img)
+    output = []
+
+    def upsampled(plane):
+        return cv2.resize(plane, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    for k in range(n):
+        q = upsampled(255.0 * coefficients[:, :, 3 * n + k])
+        for channel in range(3):
+            factor = cv2.multiply(upsampled(coefficients[:, :, channel * n + k]), guide[channel],
+                                  dtype=cv2.CV_32F)
+            cv2.add(q, factor, dst=q)
+        # Rounds and saturates at 255, negative values are cut to 0 first
+        cv2.threshold(q, 0, 0, cv2.THRESH_TOZERO, dst=q)
+        output.append(cv2.convertScaleAbs(q))
+
+    return cv2.merge(output)
+
+
+def run_proxy(func, img: np.ndarray, proxy: int, **params) -> np.ndarray:
+    """Applies func to a proxy of img and transfers the result to full resolution"""
+    small = _proxy_image(img, proxy)
+    small_output = func(small.copy(), **params)
+
+    fit = GuidedFilter(small, cfg.proxy["radius"], cfg.proxy["epsilon"])
+    planes = [(1.0 / 255.0) * np.float32(small_output[:, :, k]) for k in range(small_output.shape[2])]
+    return apply_coefficients(img, fit.coefficients(planes))
+
+
+def compare(exact: np.ndarray, approximate: np.ndarray) -> dict:
+    """Fidelity of a proxy result against the exact output"""
+    # As stored by the encoders
+    exact = np.uint8(np.clip(np.rint(exact), 0, 255))
+    error = cv2.absdiff(exact, approximate)
+    mse = float(np.mean(np.square(error, dtype=np.float32)))
+    # PSNR is None for identical images
+    return {"psnr": float(10 * np.log10(255 ** 2 / mse)) if mse else None,
+            "mean_error": float(np.mean(error)),
+            "max_error": int(error.max()),
+            "above_8": float(np.mean(error.max(axis=2) > 8))}
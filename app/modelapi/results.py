@@ -0,0 +1,314 @@
+"""
+Content addressed cache for filter results.
+
+A result is identified by the digest of the input pixels, the model,
+its parameters (with the model's defaults filled in, so leaving a
+parameter out and sending its default value are the same request) and
+the size of the input and the output encoding. Results are encoded once
+and kept in two tiers: the encoded bytes in memory and a file in the
+preview or export storage folder named after the key, which is what the
+endpoints return.
+Both tiers are LRUs bounded by their total size in bytes. The disk tier
+survives restarts; files deleted by /cleanup are written again from the
+memory tier or recomputed.
+
+Endpoints returning image bytes only need the memory tier; their files
+are written afterwards as a background step (see persist), or not at
+all when results['persist'] is off in the config.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+import config as cfg
+from encoders import MEDIA_TYPES, Encoding
+
+
+def image_digest(img: np.ndarray) -> str:
+    """Digest of the pixels, shape and dtype of an image"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{img.shape}{img.dtype.str}".encode())
+    digest.update(np.ascontiguousarray(img).data)
+    return digest.hexdigest()
+
+
+def normalize_params(model: str, params: dict) -> dict:
+    """Parameters of a model call with the model defaults filled in"""
+    params = dict(params)
+    # Not a model argument, see proxy.py
+    proxy = params.pop("proxy", 0)
+    signature = inspect.signature(cfg.models[model]["func"])
+    bound = signature.bind(None, **params)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    # The image argument
+    arguments.pop(next(iter(signature.parameters)))
+    if proxy:
+        arguments["proxy"] = proxy
+    return arguments
+
+
+def result_key(digest: str, model: str, params: dict, shape: tuple, encoding: Encoding) -> str:
+    request = json.dumps([digest, model, normalize_params(model, params), list(shape[:2]), encoding.key],
+                         sort_keys=True, default=str)
+    return hashlib.blake2b(request.encode(), digest_size=20).hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, folders: dict, memory_bytes: int, disk_bytes: int, persist: bool):
+        self.folders = folders
+        self.write_files = persist
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        # Per format: number of encoded results, their bytes and seconds spent
+        self.encoding_stats = {}
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+
+        # Index existing results, least recently used first
+        files = []
+        for folder in folders.values():
+            if os.path.isdir(folder):
+                for entry in os.scandir(folder):
+                    if _is_result(entry.name):
+                        files.append(entry)
+                    elif entry.name.endswith(_PARTIAL):
+                        # Left by a write that never finished
+                        os.remove(entry.path)
+        for entry in sorted(files, key=lambda entry: entry.stat().st_mtime):
+            key = entry.name.split("_", 1)[0]
+            self._disk[key] = (entry.path, entry.stat().st_size)
+            self._disk_size += entry.stat().st_size
+        self._evict()
+
+    def _file_name(self, key: str, model: str, folder: str, extension: str) -> str:
+        return os.path.join(self.folders[folder], f"{key}_{model}{extension}")
+
+    def _evict(self):
+        while self._memory_size > self.memory_bytes and self._memory:
+            _, (_, data) = self._memory.popitem(last=False)
+            self._memory_size -= len(data)
+        while self._disk_size > self.disk_bytes and self._disk:
+            _, (name, size) = self._disk.popitem(last=False)
+            self._disk_size -= size
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+    def _store_file(self, key: str, name: str, data: bytes):
+        """
+        Writes the file of a result and indexes it. Must be called
+        without holding the lock: the file is written next to its
+        final name and then renamed into place, so readers see the
+        whole file or none, and so does a restart after a crash.
+        """
+        partial = f"{name}.{uuid.uuid4().hex}{_PARTIAL}"
+        try:
+            with open(partial, "wb") as file:
+                file.write(data)
+            os.replace(partial, name)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+        with self._lock:
+            if key in self._disk:
+                self._disk_size -= self._disk[key][1]
+            self._disk[key] = (name, len(data))
+            self._disk_size += len(data)
+            self._evict()
+
+    def get(self, key: str, count: bool = True) -> str | None:
+        """
+        Returns the location of a cached result, or None. A result
+        only found in memory is written back to disk. Without count,
+        the lookup is left out of the stats.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                name, data = self._memory[key]
+                self.stats["memory_hits"] += count
+                if key in self._disk and os.path.exists(name):
+                    self._disk.move_to_end(key)
+                    return name
+            else:
+                if key in self._disk:
+                    name, size = self._disk[key]
+                    if os.path.exists(name):
+                        self._disk.move_to_end(key)
+                        os.utime(name)
+                        self.stats["disk_hits"] += count
+                        return name
+                    # Removed behind our back
+                    del self._disk[key]
+                    self._disk_size -= size
+
+                self.stats["misses"] += count
+                return None
+
+        # Written back outside the lock
+        self._store_file(key, name, data)
+        return name
+
+    def get_data(self, key: str, keep: bool = True) -> bytes | None:
+        """
+        Returns the encoded bytes of a cached result, or None. A
+        result only found on disk is loaded into memory if keep is
+        set.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self._memory[key][1]
+            entry = self._disk.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+        # Read without holding the lock
+        name, size = entry
+        try:
+            with open(name, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            data = None
+
+        with self._lock:
+            if data is None:
+                if self._disk.get(key) == entry:
+                    del self._disk[key]
+                    self._disk_size -= size
+                self.stats["misses"] += 1
+                return None
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            if keep:
+                self._store_memory(key, name, data)
+                self._evict()
+            self.stats["disk_hits"] += 1
+            return data
+
+    def location(self, key: str) -> str | None:
+        """File name of a cached result (the file may not be written yet)"""
+        with self._lock:
+            entry = self._memory.get(key) or self._disk.get(key)
+            return entry[0] if entry else None
+
+    def _store_memory(self, key: str, name: str, data: bytes):
+        if key in self._memory:
+            self._memory_size -= len(self._memory[key][1])
+        self._memory[key] = (name, data)
+        self._memory_size += len(data)
+
+    def put(self,
+            key: str,
+            model: str,
+            output: np.ndarray,
+            folder: str,
+            encoding: Encoding,
+            write: bool = True,
+            keep: bool = True) -> tuple:
+        """
+        Encodes a result, caches it and returns its location in
+        the given storage folder ("preview" or "export") and the
+        encoded bytes. The file is only written when write is set,
+        the bytes only kept in memory when keep is set.
+        """
+        start = time.time()
+        data = encoding.encode(output)
+        return self.put_encoded(key, model, data, folder, encoding, time.time() - start, write, keep), data
+
+    def put_encoded(self,
+                    key: str,
+                    model: str,
+                    data: bytes,
+                    folder: str,
+                    encoding: Encoding,
+                    seconds: float,
+                    write: bool = True,
+                    keep: bool = True) -> str:
+        """
+        Same as put for a result encoded elsewhere in the given
+        seconds, returns the location only.
+        """
+        with self._lock:
+            stats = self.encoding_stats.setdefault(encoding.format, {"count": 0, "bytes": 0, "seconds": 0.0})
+            stats["count"] += 1
+            stats["bytes"] += len(data)
+            stats["seconds"] += seconds
+        return self.store(key, model, data, folder, encoding, write, keep)
+
+    def store(self,
+              key: str,
+              model: str,
+              data: bytes,
+              folder: str,
+              encoding: Encoding,
+              write: bool = True,
+              keep: bool = True) -> str:
+        """Caches encoded bytes without counting them as an encoding"""
+        name = self._file_name(key, model, folder, encoding.extension)
+
+        if write:
+            self._store_file(key, name, data)
+        if keep:
+            with self._lock:
+                self._store_memory(key, name, data)
+                self._evict()
+
+        return name
+
+    def persist(self, key: str):
+        """
+        Writes the file of a result only held in memory, if files
+        are enabled. Meant to run after the response was sent.
+        """
+        if not self.write_files:
+            return
+        with self._lock:
+            if key not in self._memory:
+                return
+            name, data = self._memory[key]
+            if key in self._disk and os.path.exists(name):
+                return
+        self._store_file(key, name, data)
+
+    def info(self) -> dict:
+        with self._lock:
+            return {**self.stats,
+                    "encoding": {format: dict(stats) for format, stats in self.encoding_stats.items()},
+                    "memory_entries": len(self._memory),
+                    "memory_bytes": self._memory_size,
+                    "disk_entries": len(self._disk),
+                    "disk_bytes": self._disk_size}
+
+
+# Suffix of result files being written
+_PARTIAL = ".partial"
+
+
+def _is_result(name: str) -> bool:
+    key = name.split("_", 1)[0]
+    extension = os.path.splitext(name)[1]
+    return extension in MEDIA_TYPES and len(key) == 40 and all(c in "0123456789abcdef" for c in key)
+
+
+results = ResultCache({"preview": cfg.paths["preview"], "export": cfg.paths["export"]},
+                      **cfg.results)
@@ -0,0 +1,80 @@
+"""
+Image sessions.
+
+The frontend uploads an image once and refers to it by session ID in
+later preview and export requests. Every session keeps the decoded full
+resolution image and its preview thumbnail, so interactive requests
+skip the upload, decode and resize. Sessions live in a bounded LRU and
+expire after a period without access; requests for an unknown or
+expired session get 404 and the client uploads the image again.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+from fastapi import HTTPException
+
+import config as cfg
+from results import image_digest
+
+
+class ImageSession:
+
+    def __init__(self, image: np.ndarray, preview: np.ndarray):
+        self.id = uuid.uuid4().hex
+        # Shared by all requests of the session, models get copies
+        self.image = image
+        self.preview = preview
+        self.image.flags.writeable = False
+        self.preview.flags.writeable = False
+        # Result cache keys
+        self.digest = image_digest(image)
+        self.preview_digest = image_digest(preview)
+        self.accessed = time.monotonic()
+
+
+class SessionStore:
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.accessed < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    def add(self, session: ImageSession) -> ImageSession:
+        with self._lock:
+            self._expire(time.monotonic())
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.size:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> ImageSession:
+        """Returns a session and marks it as used, raises 404 when unknown"""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise HTTPException(status_code=404,
+                                    detail=f"Unknown or expired session: {session_id}")
+            session.accessed = now
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+
+sessions = SessionStore(**cfg.sessions)
@@ -0,0 +1,64 @@
+"""
+Single-flight execution of identical requests.
+
+When several clients send the same image, model and parameters at the
+same time (a team opening the same survey image, a double click), the
+result cache misses for all of them, since none has finished yet.
+Computations are therefore keyed by their result key (see results.py)
+while they run: the first request starts the computation, identical
+requests arriving before it finishes wait for the same one. The
+computation is cancelled only when every request waiting for it is
+gone (timed out or disconnected).
+"""
+
+import asyncio
+
+
+class _Flight:
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self.stats = {"started": 0, "joined": 0}
+        self._flights = {}
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def run(self, key: str, factory):
+        """
+        Returns the result of await factory(), computed once for
+        concurrent calls with the same key, and whether this call
+        joined a computation another call started. Must be called
+        from the event loop.
+        """
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if joined:
+            self.stats["joined"] += 1
+        else:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(factory()))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.stats["started"] += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), joined
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody waits for the result anymore, later requests start over
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def info(self) -> dict:
+        return {**self.stats, "running": len(self._flights)}
+
+
+inflight = SingleFlight()
@@ -0,0 +1,28 @@
+"""Every model can be exported in every output format"""
+
+import cv2
+import numpy as np
+import pytest
+
+import config as cfg
+from encoders import FORMATS, Encoding
+from executor import call_model
+
+
+@pytest.fixture(scope="module")
+def image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (96, 128, 3), dtype=np.uint8)
+
+
+@pytest.fixture(scope="module")
+def outputs(image):
+    return {model: call_model(model, image.copy()) for model in cfg.models}
+
+
+@pytest.mark.parametrize("format", sorted(FORMATS))
+@pytest.mark.parametrize("model", sorted(cfg.models))
+def test_export(outputs, image, model, format):
+    data = Encoding(format).encode(outputs[model])
+    decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == image.shape
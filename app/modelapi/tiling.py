@@ -0,0 +1,100 @@
+"""
+Tiled execution for very large images (survey stitches, orthomosaics).
+
+The filters hold several float64 planes of the image size, which does
+not fit for mosaics of hundreds of megapixels. Models with a "tiled"
+recipe in config.models run tile by tile instead when the image has
+more than tiling['pixels'] pixels. A recipe is a module with three
+functions, all taking the model parameters with the model's defaults
+filled in:
+
+    statistics(tiles, **params)     global statistics of the image
+                                    (atmospheric light, channel ranges,
+                                    ...); tiles(halo) returns a TileGrid,
+                                    so a recipe may take several passes
+    halo(**params)                  pixels of context the model reads
+                                    around a pixel (window radius,
+                                    guided filter reach)
+    render(tile, stats, **params)   the output of the core of a tile
+
+Every tile is read with its halo, so pixels at tile borders see the
+same neighborhood as in the whole image and the output has no seams.
+Memory is bounded by the tile size; the image and the output may be
+numpy memmaps.
+"""
+
+import inspect
+
+import numpy as np
+
+import config as cfg
+
+
+class Tile:
+
+    def __init__(self, img: np.ndarray, region: tuple, outer: tuple):
+        # Slices of the core in the image
+        self.region = region
+        # Slices of the core in data
+        self.core = tuple(slice(r.start - o.start, r.stop - o.start) for r, o in zip(region, outer))
+        self.data = np.ascontiguousarray(img[outer])
+
+    @property
+    def origin(self) -> tuple:
+        return self.region[0].start, self.region[1].start
+
+    def crop(self, plane: np.ndarray) -> np.ndarray:
+        """Core of a plane computed on data"""
+        return plane[self.core]
+
+
+class TileGrid:
+
+    def __init__(self, img: np.ndarray, size: int, halo: int):
+        self.img = img
+        self.size = size
+        self.halo = halo
+        self.shape = img.shape
+
+    def __len__(self) -> int:
+        height, width = self.shape[:2]
+        return -(-height // self.size) * -(-width // self.size)
+
+    def __iter__(self):
+        height, width = self.shape[:2]
+        for top in range(0, height, self.size):
+            for left in range(0, width, self.size):
+                region = (slice(top, min(top + self.size, height)),
+                          slice(left, min(left + self.size, width)))
+                outer = (slice(max(top - self.halo, 0), min(top + self.size + self.halo, height)),
+                         slice(max(left - self.halo, 0), min(left + self.size + self.halo, width)))
+                yield Tile(self.img, region, outer)
+
+
+def tiled(model: str, shape: tuple) -> bool:
+    """Whether a model runs tiled on an image of the given shape"""
+    return "tiled" in cfg.models[model] and shape[0] * shape[1] > cfg.tiling["pixels"]
+
+
+def run_tiled(model: str, img: np.ndarray, out: np.ndarray = None, size: int = None, **params) -> np.ndarray:
+    """
+    Applies a model with a tiled recipe to img, tile by tile,
+    writing into out when given.
+    """
+    recipe = cfg.models[model]["tiled"]
+    size = size or cfg.tiling["size"]
+
+    # Model defaults for parameters the request left out
+    bound = inspect.signature(cfg.models[model]["func"]).bind(img, **params)
+    bound.apply_defaults()
+    params = dict(list(bound.arguments.items())[1:])
+
+    stats = recipe.statistics(lambda halo: TileGrid(img, size, halo), **params)
+
+    for tile in TileGrid(img, size, recipe.halo(**params)):
+        output = recipe.render(tile, stats, **params)
+        if out is None:
+            out = np.empty(img.shape[:2] + output.shape[2:], dtype=output.dtype)
+        out[tile.region] = output
+
+    return out